@@ -0,0 +1,94 @@
+"""
+Sprite-sheet export: cropped subtitle lines packed onto a few frame-sized atlas pages instead of
+one PNG per line, so the editor imports a handful of files and shows each line through a crop.
+"""
+import os
+
+from PIL import Image
+
+# Transparent gap around every line so editors that filter the crop edges do not bleed in neighbours
+ATLAS_PADDING = 2
+
+
+class ShelfPacker:
+    """
+    Online shelf bin packing for one page: rectangles go on the first shelf with room and enough
+    height, otherwise on a new shelf below the last one. Subtitle lines have nearly the same height,
+    so shelves fill up with little waste and nothing has to be known in advance.
+    """
+    def __init__(self, width, height, padding=ATLAS_PADDING):
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.shelves = []  # [top, height, next free x]
+        self.bottom = 0
+
+    def insert(self, width, height):
+        """Return the (left, top) given to a width x height rectangle, or None if the page is full."""
+        for shelf in self.shelves:
+            top, shelf_height, x = shelf
+            if height <= shelf_height and x + width <= self.width:
+                shelf[2] = x + width + self.padding
+                return x, top
+        if width > self.width or self.bottom + height > self.height:
+            return None
+        self.shelves.append([self.bottom, height, width + self.padding])
+        top = self.bottom
+        self.bottom += height + self.padding
+        return 0, top
+
+
+class AtlasWriter:
+    """Pack cropped line images onto atlas pages, saving each page once it is full."""
+    def __init__(self, output_dir, page_width, page_height, padding=ATLAS_PADDING, prefix="atlas", writer=None):
+        self.output_dir = output_dir
+        self.writer = writer  # png_writer.PngWriter that saves the full pages, or None to save them here
+        self.page_width = page_width
+        self.page_height = page_height
+        self.padding = padding
+        self.prefix = prefix
+        self.pages = []  # File names of the pages saved so far
+        self.page = None
+        self.packer = None
+
+    def _file_name(self):
+        return f"{self.prefix}_{len(self.pages) + 1}.png"
+
+    def _new_page(self):
+        self.page = Image.new("RGBA", (self.page_width, self.page_height), (255, 255, 255, 0))
+        self.packer = ShelfPacker(self.page_width, self.page_height, self.padding)
+
+    def add(self, image, x, y):
+        """Place a line cropped from (x, y) of the frame and return its manifest entry."""
+        if image.width > self.page_width or image.height > self.page_height:
+            raise ValueError(f"Image of {image.width}x{image.height} does not fit an atlas page of "
+                             f"{self.page_width}x{self.page_height}")
+        if self.page is None:
+            self._new_page()
+        position = self.packer.insert(image.width, image.height)
+        if position is None:
+            self._save_page()
+            self._new_page()
+            position = self.packer.insert(image.width, image.height)
+
+        left, top = position
+        self.page.paste(image, (left, top))
+        return {
+            "file": self._file_name(), "x": x, "y": y, "width": image.width, "height": image.height,
+            "crop": {"left": left, "top": top, "page_width": self.page_width, "page_height": self.page_height},
+        }
+
+    def _save_page(self):
+        output_path = os.path.join(self.output_dir, self._file_name())
+        if self.writer is not None:
+            self.writer.submit(self.page, output_path)
+        else:
+            self.page.save(output_path)
+            print(f"Saved: {output_path}")
+        self.pages.append(os.path.basename(output_path))
+        self.page = self.packer = None
+
+    def close(self):
+        """Save the last, partly filled page."""
+        if self.page is not None:
+            self._save_page()
@@ -0,0 +1,152 @@
+"""
+Run generate_all's single-pass pipeline for many projects in one process.
+
+Python, PIL and the fonts are loaded once, the font, text-metrics and romaji caches stay warm from
+one project to the next, and with --jobs every project renders on the same pool of worker
+processes, which keep their own fonts loaded between projects. The projects run one after the
+other, not overlapped: the pool drains at the end of each project (its last lines, then its
+XML and manifest) before the next one submits anything, since the caches are not thread-safe.
+
+The manifest is a JSON file; paths are relative to it and "defaults" applies to every project:
+
+    {
+        "defaults": {"font": "MochiyPopPOne-Regular", "font_size": 100, "ruby_size": 60, "fps": 24},
+        "projects": [
+            {"name": "ignite", "input": "subtitles_ignite.txt", "srt": "subtitles_ignite.srt",
+             "output_dir": "ignite_subs", "xml": "ignite_resolve_subs.xml", "stroke_width": 0}
+        ]
+    }
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from generate_all import parse_resolution, run_pipeline
+from generate_png_furigana import ImageSubtitleCreator, RenderError
+from generate_srt_romaji import transliterate_to_romaji
+from png_writer import DEFAULT_COMPRESS_LEVEL
+from profiling import PROFILER, add_profile_argument
+
+# Project keys and their defaults, the same as generate_all.py's options
+PROJECT_DEFAULTS = {
+    "xml": None,  # Default: <input>.xml
+    "romaji_srt": None,  # Default: <input>_romaji.srt
+    "fps": 24,
+    "font": None,
+    "font_size": 48,
+    "ruby_size": 24,
+    "vertical_margin": 100,
+    "text_color": "black",
+    "stroke_color": "white",
+    "stroke_width": 2,
+    "segment_spacing": 20,
+    "glyph_cache": False,
+    "crop": False,
+    "atlas": False,
+    "compress_level": DEFAULT_COMPRESS_LEVEL,
+    "quantize": False,
+    "force": False,
+    "resolutions": None,  # ["1280x720", "3840x2160", ...], see generate_all.py --resolutions
+}
+REQUIRED_KEYS = ("input", "srt", "output_dir", "font")
+
+def load_batch(manifest_path):
+    """Read a batch manifest into a list of complete project dicts with absolute paths."""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = manifest.get("defaults", {})
+
+    projects = []
+    for number, entry in enumerate(manifest["projects"], 1):
+        project = {**PROJECT_DEFAULTS, **defaults, **entry}
+        unknown = set(project) - set(PROJECT_DEFAULTS) - {"name", "input", "srt", "output_dir"}
+        if unknown:
+            raise ValueError(f"Project {number}: unknown key(s) {', '.join(sorted(unknown))}")
+        missing = [key for key in REQUIRED_KEYS if project.get(key) is None]
+        if missing:
+            raise ValueError(f"Project {number}: missing {', '.join(missing)}")
+
+        for key in ("input", "srt", "output_dir", "xml", "romaji_srt", "font"):
+            if project[key] is not None:
+                project[key] = os.path.join(base_dir, project[key])
+        input_base = os.path.splitext(project["input"])[0]
+        project["xml"] = project["xml"] or input_base + ".xml"
+        project["romaji_srt"] = project["romaji_srt"] or input_base + "_romaji.srt"
+        if project["resolutions"]:
+            try:
+                project["resolutions"] = [parse_resolution(text) for text in project["resolutions"]]
+            except argparse.ArgumentTypeError as e:
+                raise ValueError(f"Project {number}: {e}")
+        project.setdefault("name", os.path.basename(input_base))
+        projects.append(project)
+    return projects
+
+def run_project(project, jobs=1, executor=None):
+    """Run the whole pipeline for one project."""
+    os.makedirs(project["output_dir"], exist_ok=True)
+    creator = ImageSubtitleCreator(
+        project["font"], project["font_size"], project["ruby_size"], project["vertical_margin"],
+        project["text_color"], project["stroke_color"], project["stroke_width"], project["output_dir"],
+        crop=project["crop"], segment_spacing=project["segment_spacing"], glyph_cache=project["glyph_cache"],
+        compress_level=project["compress_level"], quantize=project["quantize"]
+    )
+    run_pipeline(project["input"], project["srt"], project["xml"], project["romaji_srt"], creator,
+                 fps=project["fps"], jobs=jobs, force=project["force"], atlas=project["atlas"], executor=executor,
+                 resolutions=project["resolutions"])
+
+def run_batch(projects, jobs=1, keep_going=True):
+    """Run every project in turn on one shared pool, returning [(name, error message or None), ...]."""
+    results = []
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for number, project in enumerate(projects, 1):
+            print(f"[{number}/{len(projects)}] {project['name']}")
+            start = time.perf_counter()
+            try:
+                with PROFILER.span("project", project=project["name"]):
+                    run_project(project, jobs, executor)
+            except (RenderError, ValueError, OSError) as e:
+                print(f"[{number}/{len(projects)}] {project['name']} failed: {e}")
+                results.append((project["name"], f"{type(e).__name__}: {e}"))
+                if not keep_going:
+                    break
+                continue
+            print(f"[{number}/{len(projects)}] {project['name']} done in {time.perf_counter() - start:.1f} s")
+            results.append((project["name"], None))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the single-pass pipeline for every project of a batch manifest.")
+    parser.add_argument("manifest", help="Batch manifest (JSON) listing the projects.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes shared by all projects.")
+    parser.add_argument("--stop-on-error", action="store_true", help="Stop at the first project that fails.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
+
+    try:
+        projects = load_batch(args.manifest)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+    results = run_batch(projects, jobs=args.jobs, keep_going=not args.stop_on_error)
+    if args.profile:
+        PROFILER.set_counter("romaji_cache_hits", transliterate_to_romaji.cache_info().hits)
+        PROFILER.report(args.profile)
+    failed = [(name, error) for name, error in results if error is not None]
+    print(f"{len(results) - len(failed)} of {len(projects)} project(s) done, {len(failed)} failed")
+    for name, error in failed:
+        print(f"  {name}: {error}")
+    if failed or len(results) < len(projects):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Lines per second of drawing sentences with ImageDraw.text against compositing cached glyph masks
+(--glyph-cache), and how far the two drawings are apart. Nothing is written to disk.
+
+Without stroke the two paths are pixel-identical. With stroke, pixels where the strokes of
+neighbouring glyphs overlap can differ by a few levels, because FreeType strokes the whole string
+at once while the cache strokes each glyph on its own.
+
+Run from the repository root: py -m benchmarks.bench_glyph_cache --font NAME [subtitles_ignite.json] [--repeat N]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from generate_png_furigana import ImageSubtitleCreator
+from ruby_sentence import parse_json
+
+
+def measure(name, creator, sentences):
+    start = time.perf_counter()
+    for pairs in sentences:
+        creator.draw_sentence(pairs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(sentences) / elapsed:>10,.1f} lines/s  ({elapsed * 1000:.1f} ms)")
+
+
+def compare(pil_creator, glyph_creator, sentences):
+    max_diff = 0
+    differing = total = 0
+    for pairs in sentences:
+        a = np.asarray(pil_creator.draw_sentence(pairs), dtype=np.int16)
+        b = np.asarray(glyph_creator.draw_sentence(pairs), dtype=np.int16)
+        diff = np.abs(a - b).max(axis=-1)
+        max_diff = max(max_diff, int(diff.max()))
+        differing += int(np.count_nonzero(diff))
+        total += int(np.count_nonzero(a[..., 3]))
+    share = differing / total * 100 if total else 0.0
+    print(f"max channel difference {max_diff}, {differing} of {total} drawn pixels differ ({share:.3f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PIL text drawing against the glyph raster cache.")
+    parser.add_argument("input_json", nargs="?", default="subtitles_ignite.json", help="Ruby HTML JSON array.")
+    parser.add_argument("--font", required=True, help="Font name, as for generate_png_furigana.py.")
+    parser.add_argument("--font-size", type=int, default=100)
+    parser.add_argument("--ruby-size", type=int, default=60)
+    parser.add_argument("--stroke-width", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="How many times the corpus is repeated.")
+    args = parser.parse_args()
+
+    with open(args.input_json, 'r', encoding='utf-8') as f:
+        sentences = [sentence.kanji_ruby_pairs for sentence in parse_json(json.load(f))]
+    print(f"{len(sentences)} lines x {args.repeat}, stroke width {args.stroke_width}")
+
+    def creator(glyph_cache):
+        return ImageSubtitleCreator(args.font, args.font_size, args.ruby_size, 250, "white", "black",
+                                    args.stroke_width, ".", glyph_cache=glyph_cache)
+
+    pil_creator, glyph_creator = creator(False), creator(True)
+    measure("ImageDraw.text", pil_creator, sentences * args.repeat)
+    measure("glyph cache", glyph_creator, sentences * args.repeat)
+    print(glyph_creator.cache_stats()["glyphs"])
+    compare(pil_creator, glyph_creator, sentences)
+
+
+if __name__ == "__main__":
+    main()
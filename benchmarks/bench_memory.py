@@ -0,0 +1,76 @@
+"""
+Memory per parsed line of the compact sentence model (ruby_sentence) against the dict form it
+replaced: {"kanji_ruby_pairs": [{"kanji": ..., "ruby": ...}, ...]} per line, with the HTML that
+generate_all attached for the romaji stage. Measured with tracemalloc on synthetic corpora (see
+benchmarks.corpus) or on a ruby input file; the input lines themselves are not counted, and
+"text B" is their UTF-8 size, for scale.
+
+Run from the repository root: py -m benchmarks.bench_memory [--sizes 1000 100000] [--input FILE]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks.corpus import generate_lines
+from ruby_input import read_ruby_input
+from ruby_sentence import parse_json
+from ruby_tokenizer import tokenize_ruby
+
+
+def dict_parse_sentence(html):
+    """parse_sentence before ruby_sentence, with the HTML generate_all attached for the romaji stage."""
+    kanji_ruby_pairs = []
+    plain_text = ""
+    for base, reading, _ in tokenize_ruby(html):
+        if not reading:
+            plain_text += base
+            continue
+        if plain_text.strip():
+            kanji_ruby_pairs.append({"kanji": plain_text.strip(), "ruby": ""})
+        plain_text = ""
+        kanji_ruby_pairs.append({"kanji": base.strip(), "ruby": reading.strip()})
+    if plain_text.strip():
+        kanji_ruby_pairs.append({"kanji": plain_text.strip(), "ruby": ""})
+    return {"kanji_ruby_pairs": kanji_ruby_pairs, "html": html}
+
+
+def measure(parse, lines):
+    """Bytes still allocated after parsing every line and keeping the results."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        parsed = parse(lines)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del parsed
+    return after - before
+
+
+def report(name, lines):
+    dict_bytes = measure(lambda data: [dict_parse_sentence(html) for html in data], lines)
+    compact_bytes = measure(parse_json, lines)
+    text_bytes = sum(len(line.encode("utf-8")) for line in lines)
+    count = len(lines)
+    print(f"{name:<24} {text_bytes / count:>10.0f} {dict_bytes / count:>10.0f} {compact_bytes / count:>10.0f} "
+          f"{dict_bytes / max(compact_bytes, 1):>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory per line of the parsed sentence forms.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000], help="Corpus sizes in lines.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora.")
+    parser.add_argument("--input", help="Measure a ruby .txt, .jsonl or .json file instead.")
+    args = parser.parse_args()
+
+    print(f"{'input':<24} {'text B':>10} {'dict B':>10} {'slots B':>10} {'saving':>9}  (per line)")
+    if args.input:
+        report(args.input, list(read_ruby_input(args.input)))
+        return
+    for size in args.sizes:
+        report(f"{size} synthetic lines", generate_lines(size, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Throughput of generate_srt_romaji.transliterate_to_romaji against the per-call version it
+replaced, on the readings of a ruby HTML corpus.
+
+Run from the repository root: py -m benchmarks.bench_romaji [subtitles_ignite.json] [--repeat N]
+"""
+import argparse
+import json
+import time
+
+from generate_srt_romaji import extract_text_and_readings, transliterate_many, transliterate_to_romaji
+
+
+def legacy_transliterate_to_romaji(text):
+    """generate_srt_romaji.transliterate_to_romaji before the precompiled engine."""
+    hiragana_to_romaji = {
+        'あ': 'a', 'い': 'i', 'う': 'u', 'え': 'e', 'お': 'o',
+        'か': 'ka', 'き': 'ki', 'く': 'ku', 'け': 'ke', 'こ': 'ko',
+        'さ': 'sa', 'し': 'shi', 'す': 'su', 'せ': 'se', 'そ': 'so',
+        'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
+        'な': 'na', 'に': 'ni', 'ぬ': 'nu', 'ね': 'ne', 'の': 'no',
+        'は': 'ha', 'ひ': 'hi', 'ふ': 'fu', 'へ': 'he', 'ほ': 'ho',
+        'ま': 'ma', 'み': 'mi', 'む': 'mu', 'め': 'me', 'も': 'mo',
+        'や': 'ya', 'ゆ': 'yu', 'よ': 'yo',
+        'ら': 'ra', 'り': 'ri', 'る': 'ru', 'れ': 're', 'ろ': 'ro',
+        'わ': 'wa', 'を': 'wo', 'ん': 'n',
+        'が': 'ga', 'ぎ': 'gi', 'ぐ': 'gu', 'げ': 'ge', 'ご': 'go',
+        'ざ': 'za', 'じ': 'ji', 'ず': 'zu', 'ぜ': 'ze', 'ぞ': 'zo',
+        'だ': 'da', 'ぢ': 'ji', 'づ': 'zu', 'で': 'de', 'ど': 'do',
+        'ば': 'ba', 'び': 'bi', 'ぶ': 'bu', 'べ': 'be', 'ぼ': 'bo',
+        'ぱ': 'pa', 'ぴ': 'pi', 'ぷ': 'pu', 'ぺ': 'pe', 'ぽ': 'po',
+        'きゃ': 'kya', 'きゅ': 'kyu', 'きょ': 'kyo',
+        'しゃ': 'sha', 'しゅ': 'shu', 'しょ': 'sho',
+        'ちゃ': 'cha', 'ちゅ': 'chu', 'ちょ': 'cho',
+        'にゃ': 'nya', 'にゅ': 'nyu', 'にょ': 'nyo',
+        'ひゃ': 'hya', 'ひゅ': 'hyu', 'ひょ': 'hyo',
+        'みゃ': 'mya', 'みゅ': 'myu', 'みょ': 'myo',
+        'りゃ': 'rya', 'りゅ': 'ryu', 'りょ': 'ryo',
+        'ぎゃ': 'gya', 'ぎゅ': 'gyu', 'ぎょ': 'gyo',
+        'じゃ': 'ja', 'じゅ': 'ju', 'じょ': 'jo',
+        'びゃ': 'bya', 'びゅ': 'byu', 'びょ': 'byo',
+        'ぴゃ': 'pya', 'ぴゅ': 'pyu', 'ぴょ': 'pyo',
+        'っ': '',
+    }
+
+    romaji_text = ""
+    i = 0
+    while i < len(text):
+        if i < len(text) - 1 and text[i] == 'っ':
+            next_char = text[i + 1]
+            if next_char in hiragana_to_romaji:
+                next_romaji = hiragana_to_romaji[next_char]
+                if next_romaji and next_romaji[0] != 'n':
+                    romaji_text += next_romaji[0]
+            i += 1
+            continue
+        if i + 1 < len(text) and text[i:i+2] in hiragana_to_romaji:
+            romaji_text += hiragana_to_romaji[text[i:i+2]]
+            i += 2
+        elif text[i] in hiragana_to_romaji:
+            romaji_text += hiragana_to_romaji[text[i]]
+            i += 1
+        else:
+            romaji_text += text[i]
+            i += 1
+    return romaji_text
+
+
+def measure(name, func, terms):
+    start = time.perf_counter()
+    func(terms)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<36} {len(terms) / elapsed:>12,.0f} terms/s  ({elapsed * 1000:.1f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kana to romaji transliteration.")
+    parser.add_argument("input_json", nargs="?", default="subtitles_ignite.json", help="Ruby HTML JSON array.")
+    parser.add_argument("--repeat", type=int, default=500, help="How many times the corpus is repeated.")
+    args = parser.parse_args()
+
+    with open(args.input_json, 'r', encoding='utf-8') as f:
+        lines = json.load(f)
+    terms = [part for html in lines for part in extract_text_and_readings(html)] * args.repeat
+    print(f"{len(terms)} terms, {len(set(terms))} distinct")
+
+    measure("legacy (table rebuilt per call)", lambda data: [legacy_transliterate_to_romaji(t) for t in data], terms)
+    transliterate_to_romaji.cache_clear()
+    measure("engine, cold memo", transliterate_many, terms)
+    measure("engine, warm memo", transliterate_many, terms)
+    transliterate_to_romaji.cache_clear()
+    distinct = sorted(set(terms))
+    measure("engine, distinct terms only", transliterate_many, distinct)
+    print(transliterate_to_romaji.cache_info())
+
+
+if __name__ == "__main__":
+    main()
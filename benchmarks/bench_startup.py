@@ -0,0 +1,72 @@
+"""
+Startup cost of every furigana.py command: wall time of `furigana.py <command> --help` in a fresh
+interpreter, the import time Python reports for it (-X importtime), and whether it loaded PIL or
+NumPy. The light commands must not load either and must stay under --budget-ms of imports;
+the exit status is 1 otherwise.
+
+Run from the repository root: py -m benchmarks.bench_startup [--repeat N] [--budget-ms MS]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from furigana import COMMANDS
+
+LIGHT_COMMANDS = ("convert", "romaji", "xml")
+HEAVY_MODULES = ("PIL", "numpy")
+
+
+def measure(command, repeat):
+    """(best wall seconds, import microseconds, heavy modules imported) of `furigana.py command --help`."""
+    args = [sys.executable, "-X", "importtime", "furigana.py"] + ([command, "--help"] if command else [])
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(args, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    total = 0
+    heavy = set()
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package", nesting shown by indentation
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # The header line
+        if not name.startswith("  "):
+            total += int(cumulative)  # Top level imports include their nested ones
+        if name.strip().split(".")[0] in HEAVY_MODULES:
+            heavy.add(name.strip().split(".")[0])
+    return best, total, sorted(heavy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the startup cost of every furigana.py command.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command; the fastest is kept.")
+    parser.add_argument("--budget-ms", type=float, default=60.0,
+                        help="Largest import time allowed for the light commands (default: 60 ms).")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'command':<10} {'wall ms':>10} {'imports ms':>12}  heavy modules")
+    for command in [None, *COMMANDS]:
+        wall, imports, heavy = measure(command, args.repeat)
+        name = command or "(usage)"
+        print(f"{name:<10} {wall * 1000:>10.1f} {imports / 1000:>12.1f}  {', '.join(heavy) or '-'}")
+        if command is None or command in LIGHT_COMMANDS:
+            if heavy:
+                failures.append(f"{name} imports {', '.join(heavy)}")
+            if imports / 1000 > args.budget_ms:
+                failures.append(f"{name} spends {imports / 1000:.1f} ms importing (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
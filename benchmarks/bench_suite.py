@@ -0,0 +1,204 @@
+"""
+Every stage of the pipeline on synthetic corpora (see benchmarks.corpus) at several sizes, on its
+own and end to end, with the results saved as JSON and compared with a baseline.
+
+Stages: parse_json, extract_text_and_readings, transliterate_to_romaji (cold memo),
+render_sentence_image (the first --render-lines lines), create_xmeml and the generate_all
+pipeline. The rendering stages need --font and are skipped without it; end to end only runs up
+to --e2e-max-lines lines, since it renders every distinct line.
+
+Each result is the best rate of --repeat runs. A stage more than --tolerance slower than in the
+baseline is reported as a regression and the exit status is 1. The baseline is --baseline, or
+benchmarks/baseline.json when it exists (--no-baseline skips the comparison). The committed one
+records the machine it was measured on; rates from another machine are only roughly comparable,
+so store your own before relying on the regressions.
+
+Run from the repository root:
+    py -m benchmarks.bench_suite --font NAME [--sizes 10 1000 100000] [--baseline FILE]
+    py -m benchmarks.bench_suite --font NAME --output benchmarks/baseline.json  (to store a baseline)
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+from benchmarks.corpus import write_corpus
+from generate_all import run_pipeline
+from generate_png_furigana import ImageSubtitleCreator, write_manifest
+from generate_srt_romaji import extract_text_and_readings, transliterate_to_romaji
+from generate_xml import create_xmeml
+from ruby_input import read_ruby_lines
+from ruby_sentence import parse_json
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+
+
+def quiet(func, *args):
+    """Run func without the per-image and per-file prints of the stages."""
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return func(*args)
+
+
+def best_time(func, repeat, setup=None):
+    """Fastest of repeat runs of func(), with setup() run untimed before each."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def make_creator(args, output_dir):
+    return ImageSubtitleCreator(args.font, args.font_size, args.ruby_size, 250, "white", "black",
+                                args.stroke_width, output_dir)
+
+
+def bench_size(count, work_dir, args):
+    """Time every stage on a corpus of count lines and return {stage: result}."""
+    txt_path, srt_path = write_corpus(count, work_dir, args.seed)
+    lines = list(read_ruby_lines(txt_path))
+    results = {}
+
+    def record(stage, items, unit, seconds):
+        results[stage] = {"items": items, "unit": unit, "seconds": seconds, "per_second": items / seconds}
+        print(f"{count:>8} lines  {stage:<28} {items / seconds:>14,.0f} {unit}/s  ({seconds * 1000:.1f} ms)")
+
+    record("parse_json", len(lines), "lines", best_time(lambda: parse_json(lines), args.repeat))
+    record("extract_text_and_readings", len(lines), "lines",
+           best_time(lambda: [extract_text_and_readings(html) for html in lines], args.repeat))
+
+    terms = [part for html in lines for part in extract_text_and_readings(html)]
+    record("transliterate_to_romaji", len(terms), "terms",
+           best_time(lambda: [transliterate_to_romaji(term) for term in terms], args.repeat,
+                     setup=transliterate_to_romaji.cache_clear))
+
+    # The XML stage only reads the manifest, so a synthetic one stands in for the images
+    xml_dir = os.path.join(work_dir, "xml")
+    os.makedirs(xml_dir, exist_ok=True)
+    entries = [{"file": f"sentence_{i + 1}.png", "x": 0, "y": 0, "width": 1920, "height": 1080}
+               for i in range(count)]
+    write_manifest(xml_dir, entries, 1920, 1080)
+    record("create_xmeml", count, "lines",
+           best_time(lambda: quiet(create_xmeml, xml_dir, srt_path, os.path.join(work_dir, "timeline.xml")),
+                     args.repeat))
+
+    if args.font is None:
+        return results
+
+    sentences = [sentence.kanji_ruby_pairs for sentence in parse_json(lines[:args.render_lines])]
+    render_dir = os.path.join(work_dir, "render")
+    os.makedirs(render_dir, exist_ok=True)
+    creator = make_creator(args, render_dir)
+    record("render_sentence_image", len(sentences), "lines",
+           best_time(lambda: quiet(lambda: [creator.render_sentence_image(pairs, i)
+                                            for i, pairs in enumerate(sentences)]), args.repeat))
+
+    if count <= args.e2e_max_lines:
+        pipeline_dir = os.path.join(work_dir, "pipeline")
+
+        def clean():
+            # Start every run without images or manifest, so nothing is reused from the last one
+            if os.path.isdir(pipeline_dir):
+                for name in os.listdir(pipeline_dir):
+                    os.remove(os.path.join(pipeline_dir, name))
+            os.makedirs(pipeline_dir, exist_ok=True)
+
+        def pipeline():
+            quiet(run_pipeline, txt_path, srt_path, os.path.join(work_dir, "pipeline.xml"),
+                  os.path.join(work_dir, "pipeline_romaji.srt"), make_creator(args, pipeline_dir))
+
+        record("end_to_end", count, "lines", best_time(pipeline, args.repeat, setup=clean))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions as (key, baseline rate, new rate), printing every compared stage."""
+    regressions = []
+    for key, result in sorted(results.items()):
+        old = baseline.get(key)
+        if old is None:
+            continue
+        change = result["per_second"] / old["per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append((key, old["per_second"], result["per_second"]))
+            flag = "  REGRESSION"
+        print(f"{key:<40} {change * 100:>+8.1f}%{flag}")
+    return regressions
+
+
+def machine():
+    """What the rates were measured on, saved with them."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage on synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000], help="Corpus sizes in lines.")
+    parser.add_argument("--font", help="Font name, as for generate_png_furigana.py; rendering is skipped without it.")
+    parser.add_argument("--font-size", type=int, default=100)
+    parser.add_argument("--ruby-size", type=int, default=60)
+    parser.add_argument("--stroke-width", type=int, default=3)
+    parser.add_argument("--render-lines", type=int, default=100, help="Lines rendered by render_sentence_image.")
+    parser.add_argument("--e2e-max-lines", type=int, default=1000, help="Largest corpus run end to end.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest is kept.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpora.")
+    parser.add_argument("--output", default="benchmarks/results.json", help="Where to save the results.")
+    parser.add_argument("--baseline", help=f"Results of an earlier run to compare with (default: {DEFAULT_BASELINE}, "
+                                            "when it exists).")
+    parser.add_argument("--no-baseline", action="store_true", help="Do not compare with any baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Slowdown against the baseline reported as a regression (default: 0.2 = 20%%).")
+    parser.add_argument("--keep", help="Keep the corpora and outputs in this directory.")
+    args = parser.parse_args()
+
+    # Read before running, since --output may replace it
+    baseline = None
+    baseline_path = args.baseline or (DEFAULT_BASELINE if os.path.exists(DEFAULT_BASELINE) else None)
+    if baseline_path and not args.no_baseline:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for count in args.sizes:
+            work_dir = os.path.join(args.keep or temp_dir, f"corpus_{count}")
+            for stage, result in bench_size(count, work_dir, args).items():
+                results[f"{count}/{stage}"] = result
+
+    this_machine = machine()
+    report = {
+        **this_machine,
+        "font": args.font,
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved as {args.output}")
+
+    if baseline is not None:
+        print(f"Compared with {baseline_path}:")
+        old_machine = {key: baseline.get(key) for key in this_machine}
+        if old_machine != this_machine:
+            print(f"  measured on another machine ({', '.join(f'{key}={value}' for key, value in old_machine.items())})")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
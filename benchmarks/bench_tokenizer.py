@@ -0,0 +1,94 @@
+"""
+Throughput of ruby_tokenizer.tokenize_ruby against the two parsers it replaced: the regex
+splitting of generate_png_furigana.parse_json and the BeautifulSoup tree of
+generate_srt_romaji.extract_text_and_readings.
+
+Run from the repository root: py -m benchmarks.bench_tokenizer [subtitles_ignite.json] [--repeat N]
+"""
+import argparse
+import json
+import re
+import time
+
+from generate_srt_romaji import extract_text_and_readings
+from ruby_sentence import parse_json
+from ruby_tokenizer import tokenize_ruby
+
+
+def legacy_parse_json(input_data):
+    """parse_json before the tokenizer, when it lived in generate_png_furigana."""
+    parsed_data = []
+    ruby_pattern = re.compile(r"<ruby>(.*?)<rt>(.*?)</rt></ruby>")
+
+    for html in input_data:
+        kanji_ruby_pairs = []
+        terms = re.split(r"(<ruby>.*?</ruby>)", html)
+        for term in terms:
+            if ruby_pattern.match(term):
+                kanji, ruby = ruby_pattern.findall(term)[0]
+                kanji_ruby_pairs.append({"kanji": kanji.strip(), "ruby": ruby.strip()})
+            else:
+                plain_text = re.sub(r"<.*?>", "", term).strip()
+                if plain_text:
+                    kanji_ruby_pairs.append({"kanji": plain_text, "ruby": ""})
+        parsed_data.append({"kanji_ruby_pairs": kanji_ruby_pairs})
+    return parsed_data
+
+
+def legacy_extract_text_and_readings(html_text):
+    """generate_srt_romaji.extract_text_and_readings before the tokenizer (needs bs4)."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_text, 'html.parser')
+    text_parts = []
+    for span in soup.find_all('span', class_='term'):
+        ruby = span.find('ruby')
+        if ruby:
+            rt = ruby.find('rt')
+            if rt:
+                furigana = rt.get_text().strip()
+                following_text = ruby.next_sibling
+                if following_text and isinstance(following_text, str):
+                    text_parts.append(furigana + following_text.strip())
+                else:
+                    text_parts.append(furigana)
+        else:
+            text = span.get_text().strip()
+            if text:
+                text_parts.append(text)
+    return text_parts
+
+
+def measure(name, func, lines):
+    start = time.perf_counter()
+    func(lines)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {len(lines) / elapsed:>12,.0f} lines/s  ({elapsed * 1000:.1f} ms)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ruby HTML parsers.")
+    parser.add_argument("input_json", nargs="?", default="subtitles_ignite.json", help="Ruby HTML JSON array.")
+    parser.add_argument("--repeat", type=int, default=200, help="How many times the input is repeated.")
+    args = parser.parse_args()
+
+    with open(args.input_json, 'r', encoding='utf-8') as f:
+        lines = json.load(f) * args.repeat
+    print(f"{len(lines)} lines")
+
+    measure("tokenize_ruby", lambda data: [tokenize_ruby(html) for html in data], lines)
+    measure("parse_json (tokenizer)", parse_json, lines)
+    measure("parse_json (legacy regex)", legacy_parse_json, lines)
+    measure("extract_text_and_readings (tokenizer)", lambda data: [extract_text_and_readings(h) for h in data], lines)
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        print("extract_text_and_readings (legacy bs4)   skipped, bs4 is not installed")
+    else:
+        measure("extract_text_and_readings (legacy bs4)",
+                lambda data: [legacy_extract_text_and_readings(h) for h in data], lines)
+
+
+if __name__ == "__main__":
+    main()
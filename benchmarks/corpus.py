@@ -0,0 +1,96 @@
+"""
+Synthetic ruby HTML corpora in the Yomitan <span class="term"> format, with a matching SRT.
+
+Lines are built from a fixed vocabulary with a seeded random generator, so the same size and
+seed always give the same corpus. Like real lyrics, some lines come back as choruses.
+
+Run from the repository root: py -m benchmarks.corpus 1000 corpus_1k [--seed N]
+"""
+import argparse
+import os
+import random
+
+# (kanji, reading, okurigana) terms; an empty reading is a kana-only term
+TERMS = [
+    ("赤", "あか", "い"), ("涙", "なみだ", ""), ("覆", "おお", "われた"), ("悲", "かな", "しみ"),
+    ("零", "くぼ", "れた"), ("温", "ぬく", "もり"), ("優", "やさ", "しさ"), ("知", "し", "った"),
+    ("筈", "はず", ""), ("傷", "きず", "つけ"), ("合", "あ", "って"), ("憎", "にく", "しみ"),
+    ("生", "う", "み"), ("出", "だ", "して"), ("痛", "いた", "み"), ("光", "ひかり", ""),
+    ("夜", "よる", ""), ("空", "そら", ""), ("心", "こころ", ""), ("夢", "ゆめ", ""),
+    ("燃", "も", "やして"), ("明日", "あした", ""), ("世界", "せかい", ""), ("約束", "やくそく", ""),
+    ("走", "はし", "り"), ("声", "こえ", ""), ("届", "とど", "かない"), ("信", "しん", "じて"),
+    ("ちょっと", "", ""), ("どうして", "", ""), ("また", "", ""), ("きっと", "", ""),
+    ("シャッター", "", ""), ("ヴァイオリン", "", ""),
+]
+PARTICLES = ["の", "で", "を", "に", "は", "が", "と", "も", "なのに", "ゆく", "んだ", "ろう"]
+CHORUS_SHARE = 0.2  # Share of lines that repeat an earlier line
+
+
+def term_html(kanji, reading, okurigana):
+    if not reading:
+        return f'<span class="term">{kanji}</span>'
+    return f'<span class="term"><ruby>{kanji}<rt>{reading}</rt></ruby>{okurigana}</span>'
+
+
+def generate_lines(count, seed=0):
+    """Return count ruby HTML lines."""
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        if lines and rng.random() < CHORUS_SHARE:
+            lines.append(rng.choice(lines))
+            continue
+        parts = []
+        for _ in range(rng.randint(3, 7)):
+            parts.append(term_html(*rng.choice(TERMS)))
+            if rng.random() < 0.6:
+                parts.append(term_html(rng.choice(PARTICLES), "", ""))
+            if rng.random() < 0.1:
+                parts.append('<span class="term"> </span>')
+        lines.append("".join(parts))
+    return lines
+
+
+def format_timecode(ms):
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02},{ms:03}"
+
+
+def generate_srt(count, seed=0):
+    """Return SRT text with count consecutive cues of 2 to 6 seconds, one text line each."""
+    rng = random.Random(seed)
+    blocks = []
+    start = 1000
+    for number in range(1, count + 1):
+        end = start + rng.randint(2000, 6000)
+        blocks.append(f"{number}\n{format_timecode(start)} --> {format_timecode(end)}\n♪\n")
+        start = end + rng.choice((0, 1, 250))
+    return "\n".join(blocks)
+
+
+def write_corpus(count, output_dir, seed=0):
+    """Write corpus.txt and corpus.srt with count lines into output_dir and return their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    txt_path = os.path.join(output_dir, "corpus.txt")
+    srt_path = os.path.join(output_dir, "corpus.srt")
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(generate_lines(count, seed)) + "\n")
+    with open(srt_path, 'w', encoding='utf-8') as f:
+        f.write(generate_srt(count, seed))
+    return txt_path, srt_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic ruby HTML corpus and its SRT.")
+    parser.add_argument("count", type=int, help="Number of lines.")
+    parser.add_argument("output_dir", help="Directory for corpus.txt and corpus.srt.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in write_corpus(args.count, args.output_dir, args.seed):
+        print(f"Saved: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Render the furigana subtitles straight into a video with ffmpeg, without writing a PNG per line.
+
+Raw RGBA frames are streamed to ffmpeg over stdin. A frame is only drawn when the subtitle on
+screen changes; the frames in between repeat the same bytes, so drawing cost grows with the
+number of subtitles, not with the length of the video. Without --video the result is a
+transparent subtitle track; with --video the subtitles are burned into that video.
+"""
+import os
+import argparse
+import subprocess
+from collections import OrderedDict
+
+from generate_png_furigana import ImageSubtitleCreator
+from generate_xml import iter_srt_timings, timecode_to_frames
+from profiling import PROFILER, add_profile_argument
+from ruby_input import read_ruby_input
+from ruby_sentence import iter_sentences
+
+# Alpha-capable codec for the transparent track, and a widely playable one for burned-in video
+TRANSPARENT_CODEC = ["-c:v", "qtrle"]
+BURN_IN_CODEC = ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "copy"]
+
+def ffmpeg_command(output_video, width, height, fps, video=None, codec=None, ffmpeg="ffmpeg"):
+    """ffmpeg arguments that read raw RGBA frames from stdin, overlaid on video if given."""
+    frames = ["-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}", "-framerate", str(fps), "-i", "-"]
+    if video is None:
+        return [ffmpeg, "-y", "-loglevel", "error", *frames, *(codec or TRANSPARENT_CODEC), output_video]
+    return [
+        ffmpeg, "-y", "-loglevel", "error", "-i", video, *frames,
+        # Keep the video running after the last subtitle
+        "-filter_complex", "[0:v][1:v]overlay=eof_action=pass:format=auto[v]",
+        "-map", "[v]", "-map", "0:a?", *(codec or BURN_IN_CODEC), output_video,
+    ]
+
+def subtitle_spans(sentences, srt_file, fps=24, start_timecode="00:00:00,000"):
+    """
+    Yield (start_frame, end_frame, sentence) for each subtitle, counted from start_timecode.
+
+    A subtitle that overlaps the next one is cut where the next one starts.
+    """
+    previous = None
+    count = 0
+    origin = timecode_to_frames(start_timecode, fps)
+    cues = iter_srt_timings(srt_file)
+    for index, sentence in enumerate(sentences):
+        cue = next(cues, None)
+        if cue is None:
+            raise ValueError(f"{srt_file} has fewer subtitles than there are lines ({index})")
+        start, end = timecode_to_frames(cue[0], fps) - origin, timecode_to_frames(cue[1], fps) - origin
+        if previous is not None:
+            yield previous[0], min(previous[1], start), previous[2]
+        previous = (start, end, sentence)
+        count = index + 1
+    if next(cues, None) is not None:
+        raise ValueError(f"{srt_file} has more subtitles than there are lines ({count})")
+    if previous is not None:
+        yield previous
+
+class FrameCache:
+    """The last few subtitle frames as raw RGBA bytes, so repeated lines are not drawn again."""
+    def __init__(self, creator, maxsize=4):
+        self.creator = creator
+        self.maxsize = maxsize
+        self._frames = OrderedDict()
+        self.drawn = 0
+
+    def frame(self, kanji_ruby_pairs):
+        key = self.creator.sentence_key(kanji_ruby_pairs)
+        frame = self._frames.get(key)
+        if frame is None:
+            frame = self._frames[key] = self.creator.draw_sentence(kanji_ruby_pairs).tobytes()
+            self.drawn += 1
+            if len(self._frames) > self.maxsize:
+                self._frames.popitem(last=False)
+        else:
+            self._frames.move_to_end(key)
+        return frame
+
+def burn_in(sentences, srt_file, output_video, creator, fps=24, video=None, codec=None, ffmpeg="ffmpeg",
+            start_timecode="00:00:00,000"):
+    """Stream the subtitle frames of sentences, timed by srt_file, into ffmpeg."""
+    command = ffmpeg_command(output_video, creator.width, creator.height, fps, video, codec, ffmpeg)
+    blank = bytes(creator.width * creator.height * 4)
+    frames = FrameCache(creator)
+    position = 0  # Frames written so far
+    changes = 0
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for start, end, sentence in subtitle_spans(sentences, srt_file, fps, start_timecode):
+            start = max(start, position)
+            if end <= start:
+                continue
+            for _ in range(start - position):
+                process.stdin.write(blank)
+            frame = frames.frame(sentence.kanji_ruby_pairs)
+            with PROFILER.span("stream", frames=end - start):
+                for _ in range(end - start):
+                    process.stdin.write(frame)
+            position = end
+            changes += 1
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its return code says why
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+    PROFILER.set_counter("frames_drawn", frames.drawn)
+    PROFILER.set_counter("frames_streamed", position)
+    print(f"Drew {frames.drawn} frames for {changes} subtitles, streamed {position} frames")
+    print(f"Video saved as {output_video}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Burn furigana subtitles into a video, or render them as a transparent track, with ffmpeg."
+    )
+    parser.add_argument("input_json", help="Path to the input JSON file (or ruby HTML .txt, or .jsonl).")
+    parser.add_argument("srt_file", help="Subtitle file (SRT format) with the timings.")
+    parser.add_argument("output_video", help="Output video (.mov for a transparent track).")
+    parser.add_argument("--video", help="Video to burn the subtitles into (default: transparent track only).")
+    parser.add_argument("-f", "--fps", type=int, default=24, help="Frames per second, must match --video (default: 24).")
+    parser.add_argument("--start", default="00:00:00,000",
+                        help="SRT timecode of the first video frame, e.g. 01:00:00,000 (default: 00:00:00,000).")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable.")
+    parser.add_argument("--codec", nargs=argparse.REMAINDER,
+                        help="ffmpeg output options replacing the default codec, e.g. --codec -c:v prores_ks. Must come last.")
+    parser.add_argument("--font", required=True, help="Font name (without extension).")
+    parser.add_argument("--font-size", type=int, default=48, help="Font size for kanji.")
+    parser.add_argument("--ruby-size", type=int, default=24, help="Font size for ruby text.")
+    parser.add_argument("--vertical-margin", type=int, default=100, help="Vertical margin for the text.")
+    parser.add_argument("--text-color", default="black", help="Color of the text.")
+    parser.add_argument("--stroke-color", default="white", help="Color of the stroke.")
+    parser.add_argument("--stroke-width", type=int, default=2, help="Width of the stroke.")
+    parser.add_argument("--segment-spacing", type=int, default=20,
+                        help="Horizontal gap in pixels between kanji/ruby segments.")
+    parser.add_argument("--glyph-cache", action="store_true",
+                        help="Composite cached glyph masks with NumPy instead of drawing text with PIL.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
+
+    sentences = iter_sentences(read_ruby_input(args.input_json))
+
+    creator = ImageSubtitleCreator(
+        args.font, args.font_size, args.ruby_size, args.vertical_margin, args.text_color,
+        args.stroke_color, args.stroke_width, os.path.dirname(args.output_video) or ".",
+        segment_spacing=args.segment_spacing, glyph_cache=args.glyph_cache
+    )
+    try:
+        burn_in(sentences, args.srt_file, args.output_video, creator, fps=args.fps, video=args.video,
+                codec=args.codec, ffmpeg=args.ffmpeg, start_timecode=args.start)
+    except (ValueError, OSError, subprocess.CalledProcessError) as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    finally:
+        if args.profile:
+            PROFILER.report(args.profile)
+
+if __name__ == "__main__":
+    main()
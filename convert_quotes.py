@@ -2,6 +2,13 @@ import sys
 import json
 import os
 
+from ruby_input import read_ruby_lines, write_jsonl
+
+"""
+Optional: every stage also reads the ruby .txt directly. --jsonl writes one JSON string per line,
+streamed, instead of the JSON array.
+"""
+
 def convert_quotes(input_file):
     with open(input_file, 'r', encoding='utf-8') as file:
         content = file.read()
@@ -16,14 +23,28 @@ def convert_quotes(input_file):
 
     print(f"Converted file saved as {output_file}")
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python convert_quotes.py <input_file>")
+def convert_to_jsonl(input_file):
+    """Write the lines of input_file as JSONL, one line at a time (see ruby_input for blank lines)."""
+    output_file = os.path.splitext(input_file)[0] + '.jsonl'
+    count = write_jsonl((line.replace("\"", "'") for line in read_ruby_lines(input_file)), output_file)
+    print(f"Converted {count} lines, saved as {output_file}")
+
+def main():
+    jsonl = "--jsonl" in sys.argv
+    argv = [arg for arg in sys.argv if arg != "--jsonl"]
+    if len(argv) != 2:
+        print("Usage: python convert_quotes.py <input_file> [--jsonl]")
         sys.exit(1)
 
-    input_file = sys.argv[1]
+    input_file = argv[1]
     try:
-        convert_quotes(input_file)
+        if jsonl:
+            convert_to_jsonl(input_file)
+        else:
+            convert_quotes(input_file)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+One entry point for every step: py furigana.py <command> [options]. Run a command with --help
+for its options; they are the same as the script it stands for.
+
+Only the module of the chosen command is imported, so the light commands (romaji, xml, convert)
+never load PIL or NumPy. Check the startup cost with py -m benchmarks.bench_startup.
+"""
+import importlib
+import sys
+
+# command -> (module whose main() runs it, description)
+COMMANDS = {
+    "convert": ("convert_quotes", "Convert the ruby .txt to a JSON array, or JSONL with --jsonl (optional)."),
+    "png": ("generate_png_furigana", "Render the subtitle images."),
+    "xml": ("generate_xml", "Build the XML timeline from the images and the .srt."),
+    "romaji": ("generate_srt_romaji", "Write romaji subtitles with the timings of an .srt."),
+    "all": ("generate_all", "Images, romaji and XML timeline in a single pass."),
+    "ass": ("generate_ass", "Write an ASS subtitle track instead of images."),
+    "burn": ("burn_in", "Burn the subtitles into a video with ffmpeg."),
+    "batch": ("batch", "Run the single pass for every project of a manifest."),
+    "serve": ("render_server", "Keep fonts warm in a local render server."),
+}
+
+
+def usage():
+    lines = ["usage: furigana.py <command> [options]", "", "commands:"]
+    lines += [f"  {name:<8} {description}" for name, (_, description) in COMMANDS.items()]
+    lines += ["", "Run furigana.py <command> --help for the options of a command."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"Unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        raise SystemExit(2)
+
+    module_name, _ = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    # The command's own parser reads sys.argv and reports itself as "furigana.py <command>"
+    sys.argv = [f"furigana.py {command}", *args]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
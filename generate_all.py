@@ -0,0 +1,158 @@
+"""
+Single pass over the ruby .txt and the timing .srt: every line is parsed once and streamed through
+the PNG, romaji and XML stages, replacing the convert_quotes -> png -> romaji -> xml script chain.
+"""
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import tee
+
+from generate_png_furigana import ImageSubtitleCreator, ImageBuild, RenderError
+from generate_srt_romaji import romaji_line, transliterate_to_romaji
+from generate_xml import XmemlWriter, iter_srt_timings, timecode_to_frames
+from png_writer import DEFAULT_COMPRESS_LEVEL
+from profiling import PROFILER, add_profile_argument
+from ruby_input import read_ruby_input
+from ruby_sentence import iter_sentences
+
+def parse_resolution(text):
+    """WIDTHxHEIGHT (e.g. 3840x2160) as a (width, height) tuple."""
+    try:
+        width, height = (int(value) for value in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got {text!r}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"Expected a positive WIDTHxHEIGHT, got {text!r}")
+    return width, height
+
+def resolution_targets(creator, output_xml, resolutions):
+    """(creator, output XML) per resolution: images in <output_dir>/<W>x<H>, timelines as <xml>_<W>x<H>.xml."""
+    xml_base, xml_ext = os.path.splitext(output_xml)
+    targets = []
+    for width, height in resolutions:
+        name = f"{width}x{height}"
+        output_dir = os.path.join(creator.output_dir, name)
+        os.makedirs(output_dir, exist_ok=True)
+        targets.append((ImageSubtitleCreator(**dict(creator.settings(), output_dir=output_dir, width=width,
+                                                     height=height)),
+                        f"{xml_base}_{name}{xml_ext}"))
+    return targets
+
+def run_pipeline(input_txt, srt_file, output_xml, romaji_srt, creator, fps=24, jobs=1, force=False, atlas=False,
+                 executor=None, resolutions=None):
+    """Render the images, romaji subtitles and XML timeline for input_txt in one streaming pass.
+
+    executor is an already running process pool of jobs workers to render on, kept open afterwards.
+    With resolutions, a list of (width, height), every line is parsed and laid out once and drawn
+    at each of them, with creator's sizes scaled to the frame; see resolution_targets for the paths.
+    """
+    cues = iter_srt_timings(srt_file)
+    sentences = iter_sentences(read_ruby_input(input_txt))
+    targets = resolution_targets(creator, output_xml, resolutions) if resolutions else [(creator, output_xml)]
+
+    entries = [[] for _ in targets]
+    failures = []
+    count = 0
+    with ExitStack() as stack:
+        # One pool for every resolution; the layouts are measured here and sent to the workers
+        if executor is None and jobs > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+        builds = [stack.enter_context(ImageBuild(target, jobs=jobs, force=force, atlas=atlas, executor=executor))
+                  for target, _ in targets]
+        writers = [stack.enter_context(XmemlWriter(xml, fps, target.width, target.height)) for target, xml in targets]
+        srt_out = stack.enter_context(open(romaji_srt, 'w', encoding='utf-8'))
+
+        # Every build reads the same parsed sentences; tee only holds the few lines one build is ahead
+        streams = tee(sentences, len(builds))
+        for results in zip(*(build.run(stream) for build, stream in zip(builds, streams))):
+            index, sentence = results[0][:2]
+            cue = next(cues, None)
+            if cue is None:
+                raise ValueError(f"{srt_file} has fewer subtitles than {input_txt} has lines ({index})")
+            start, end = cue
+            count += 1
+            PROFILER.set_line(count)
+
+            srt_out.write(f"{index + 1}\n{start} --> {end}\n{romaji_line(sentence.terms)}\n\n")
+
+            for (target, _), target_entries, writer, (_, _, entry, error) in zip(targets, entries, writers, results):
+                if error is not None:
+                    failures.append((index, error if len(targets) == 1 else f"{target.width}x{target.height}: {error}"))
+                    continue
+                target_entries.append(entry)
+                writer.add_clip(timecode_to_frames(start, fps), timecode_to_frames(end, fps),
+                                os.path.join(target.output_dir, entry["file"]), entry)
+
+        if next(cues, None) is not None:
+            raise ValueError(f"{srt_file} has more subtitles than {input_txt} has lines ({count})")
+        if failures:
+            raise RenderError(failures)
+        for build, target_entries in zip(builds, entries):
+            build.finish(target_entries)
+
+    print(f"Romaji subtitles saved as {romaji_srt}")
+    for _, xml in targets:
+        print(f"XMEML file successfully created: {xml}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render furigana images, romaji subtitles and an XML timeline in a single pass."
+    )
+    parser.add_argument("input_txt", help="Ruby HTML text file, one subtitle per line (or .jsonl, or .json).")
+    parser.add_argument("srt_file", help="Subtitle file (SRT format) with the timings.")
+    parser.add_argument("output_dir", help="Path to the output directory for the images.")
+    parser.add_argument("--xml", help="Output XML timeline (default: <input>.xml).")
+    parser.add_argument("--romaji-srt", help="Output romaji subtitles (default: <input>_romaji.srt).")
+    parser.add_argument("-f", "--fps", type=int, default=24, help="Frames per second for the timeline (default: 24).")
+    parser.add_argument("--font", required=True, help="Font name (without extension).")
+    parser.add_argument("--font-size", type=int, default=48, help="Font size for kanji.")
+    parser.add_argument("--ruby-size", type=int, default=24, help="Font size for ruby text.")
+    parser.add_argument("--vertical-margin", type=int, default=100, help="Vertical margin for the text.")
+    parser.add_argument("--text-color", default="black", help="Color of the text.")
+    parser.add_argument("--stroke-color", default="white", help="Color of the stroke.")
+    parser.add_argument("--stroke-width", type=int, default=2, help="Width of the stroke.")
+    parser.add_argument("--segment-spacing", type=int, default=20,
+                        help="Horizontal gap in pixels between kanji/ruby segments.")
+    parser.add_argument("--glyph-cache", action="store_true",
+                        help="Composite cached glyph masks with NumPy instead of drawing text with PIL.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes used for rendering.")
+    parser.add_argument("--crop", action="store_true", help="Crop each image to its text.")
+    parser.add_argument("--atlas", action="store_true", help="Pack the cropped lines onto a few atlas images.")
+    parser.add_argument("--compress-level", type=int, default=DEFAULT_COMPRESS_LEVEL, choices=range(10), metavar="0-9",
+                        help="PNG zlib level: 0 is fastest, 9 is smallest (default: 6).")
+    parser.add_argument("--quantize", action="store_true", help="Save 256-color palette PNGs.")
+    parser.add_argument("--force", action="store_true", help="Render every image again.")
+    parser.add_argument("--resolutions", type=parse_resolution, nargs="+", metavar="WxH",
+                        help="Render every listed frame size (e.g. 1280x720 3840x2160) from one parse and layout, "
+                             "into <output_dir>/<W>x<H> with one XML timeline each. Sizes are for 1080p and scaled.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
+
+    base = os.path.splitext(args.input_txt)[0]
+    output_xml = args.xml or base + ".xml"
+    romaji_srt = args.romaji_srt or base + "_romaji.srt"
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    creator = ImageSubtitleCreator(
+        args.font, args.font_size, args.ruby_size, args.vertical_margin, args.text_color,
+        args.stroke_color, args.stroke_width, args.output_dir, crop=args.crop,
+        segment_spacing=args.segment_spacing, glyph_cache=args.glyph_cache,
+        compress_level=args.compress_level, quantize=args.quantize
+    )
+    try:
+        run_pipeline(args.input_txt, args.srt_file, output_xml, romaji_srt, creator,
+                     fps=args.fps, jobs=args.jobs, force=args.force, atlas=args.atlas,
+                     resolutions=args.resolutions)
+    except (RenderError, ValueError, OSError) as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    finally:
+        if args.profile:
+            PROFILER.set_counter("romaji_cache_hits", transliterate_to_romaji.cache_info().hits)
+            PROFILER.report(args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Write the furigana subtitles as an ASS subtitle track instead of rendering images.
+
+Every sentence is measured with the same layout as the PNG stage (ImageSubtitleCreator.layout_sentence)
+and each reading and base text becomes its own top-left aligned event pinned with \\pos, so the
+ruby sits centered over its base where the image would have it. Nothing is rasterized, which makes
+this the cheap alternative to the PNG stage for players and editors that read ASS. The video's
+renderer draws the text, so the TTF must be installed on the machine that plays the track.
+"""
+import os
+import argparse
+
+from PIL import ImageColor
+
+from generate_png_furigana import ImageSubtitleCreator
+from generate_xml import iter_srt_timings, timecode_to_ms
+from profiling import PROFILER, add_profile_argument, traced
+from ruby_input import read_ruby_input
+from ruby_sentence import iter_sentences
+
+STYLE_FORMAT = ("Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+                "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+                "MarginL, MarginR, MarginV, Encoding")
+
+def ass_color(color):
+    """PIL color name or #rrggbb as an ASS &HAABBGGRR color."""
+    red, green, blue, *alpha = ImageColor.getrgb(color)
+    transparency = 255 - alpha[0] if alpha else 0
+    return f"&H{transparency:02X}{blue:02X}{green:02X}{red:02X}"
+
+def ass_time(timecode):
+    """SRT timecode as an ASS H:MM:SS.cc time."""
+    centiseconds = timecode_to_ms(timecode) // 10
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02}:{seconds:02}.{centiseconds:02}"
+
+def ass_text(text):
+    """Swap the characters ASS would read as override blocks or line breaks for full-width ones."""
+    return text.replace("\\", "＼").replace("{", "｛").replace("}", "｝")
+
+class AssWriter:
+    """Write an ASS script one sentence at a time, laid out by an ImageSubtitleCreator."""
+    def __init__(self, output_ass, creator):
+        self.creator = creator
+        self.file = open(output_ass, "w", encoding="utf-8-sig")
+        self.events = 0
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _style(self, name, size):
+        creator = self.creator
+        font = creator.fonts.get(creator.font_path, size)
+        # ASS sizes a font by its line height (ascent + descent), PIL by its em size
+        ascent, descent = font.getmetrics()
+        family = font.getname()[0]
+        return (f"Style: {name},{family},{ascent + descent},{ass_color(creator.text_color)},&H000000FF,"
+                f"{ass_color(creator.stroke_color)},&H00000000,0,0,0,0,100,100,0,0,1,{creator.scaled(creator.stroke_width)},0,7,"
+                f"0,0,0,1\n")
+
+    def _write_header(self):
+        creator = self.creator
+        self.file.write("".join([
+            "[Script Info]\n",
+            "Title: Furigana Subtitles\n",
+            "ScriptType: v4.00+\n",
+            "WrapStyle: 2\n",
+            "ScaledBorderAndShadow: yes\n",
+            f"PlayResX: {creator.width}\n",
+            f"PlayResY: {creator.height}\n",
+            "\n",
+            "[V4+ Styles]\n",
+            f"Format: {STYLE_FORMAT}\n",
+            self._style("Kanji", creator.scaled(creator.font_size)),
+            self._style("Ruby", creator.scaled(creator.ruby_size)),
+            "\n",
+            "[Events]\n",
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n",
+        ]))
+
+    @traced("ass")
+    def add_sentence(self, start, end, kanji_ruby_pairs):
+        """Write the events of one sentence shown between two SRT timecodes."""
+        creator = self.creator
+        layout = creator.layout_sentence(kanji_ruby_pairs).scaled(creator.scale)
+        # The same placement as ImageSubtitleCreator.draw_sentence
+        x_start = (creator.width - layout.width) // 2
+        y_offset = creator.height - creator.scaled(creator.vertical_margin)
+        start, end = ass_time(start), ass_time(end)
+
+        events = []
+        for segment in layout.segments:
+            if segment.ruby:
+                events.append(f"Dialogue: 0,{start},{end},Ruby,,0,0,0,,{{\\pos({x_start + segment.ruby_x:.0f},"
+                              f"{y_offset - segment.ruby_height:.0f})}}{ass_text(segment.ruby)}\n")
+            events.append(f"Dialogue: 0,{start},{end},Kanji,,0,0,0,,{{\\pos({x_start + segment.x:.0f},"
+                          f"{y_offset})}}{ass_text(segment.kanji)}\n")
+        self.file.write("".join(events))
+        self.events += len(events)
+
+    def close(self):
+        self.file.close()
+
+def create_ass(input_file, srt_file, output_ass, creator):
+    """Write output_ass with the sentences of input_file, timed by srt_file."""
+    cues = iter_srt_timings(srt_file)
+    count = 0
+    with AssWriter(output_ass, creator) as writer:
+        for sentence in iter_sentences(read_ruby_input(input_file)):
+            cue = next(cues, None)
+            if cue is None:
+                raise ValueError(f"{srt_file} has fewer subtitles than {input_file} has lines ({count})")
+            PROFILER.set_line(count + 1)
+            writer.add_sentence(cue[0], cue[1], sentence.kanji_ruby_pairs)
+            count += 1
+        if next(cues, None) is not None:
+            raise ValueError(f"{srt_file} has more subtitles than {input_file} has lines ({count})")
+    print(f"Wrote {writer.events} events for {count} subtitles")
+    print(f"ASS subtitles saved as {output_ass}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Write furigana subtitles as an ASS track laid out like the images.")
+    parser.add_argument("input_json", help="Ruby HTML input: JSON array, .txt or .jsonl.")
+    parser.add_argument("srt_file", help="Subtitle file (SRT format) with the timings.")
+    parser.add_argument("output_ass", help="Output ASS subtitle file.")
+    parser.add_argument("--font", required=True, help="Font name (without extension).")
+    parser.add_argument("--font-size", type=int, default=48, help="Font size for kanji.")
+    parser.add_argument("--ruby-size", type=int, default=24, help="Font size for ruby text.")
+    parser.add_argument("--vertical-margin", type=int, default=100, help="Vertical margin for the text.")
+    parser.add_argument("--text-color", default="black", help="Color of the text.")
+    parser.add_argument("--stroke-color", default="white", help="Color of the stroke.")
+    parser.add_argument("--stroke-width", type=int, default=2, help="Width of the stroke.")
+    parser.add_argument("--segment-spacing", type=int, default=20,
+                        help="Horizontal gap in pixels between kanji/ruby segments.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
+
+    creator = ImageSubtitleCreator(
+        args.font, args.font_size, args.ruby_size, args.vertical_margin, args.text_color,
+        args.stroke_color, args.stroke_width, os.path.dirname(args.output_ass) or ".",
+        segment_spacing=args.segment_spacing
+    )
+    try:
+        create_ass(args.input_json, args.srt_file, args.output_ass, creator)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    finally:
+        if args.profile:
+            PROFILER.report(args.profile)
+
+if __name__ == "__main__":
+    main()
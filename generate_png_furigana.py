@@ -1,12 +1,234 @@
+import hashlib
 import json
 import os
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
-import re
+
+from png_writer import DEFAULT_COMPRESS_LEVEL, PngWriter, save_png
+from profiling import PROFILER, add_profile_argument, traced
+from ruby_input import read_ruby_input
+from ruby_sentence import as_segments, as_sentence, iter_sentences
+from ruby_sentence import parse_json  # noqa: F401 (lived here before ruby_sentence)
+
+
+class FontRegistry:
+    """Cache of loaded fonts keyed by (font path, size), shared for the whole process."""
+    def __init__(self):
+        self._fonts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, font_path, size):
+        """Return the font for (font_path, size), parsing the TTF only on first use."""
+        key = (font_path, size)
+        font = self._fonts.get(key)
+        if font is None:
+            self.misses += 1
+            with PROFILER.span("load_font", font=font_path, size=size):
+                font = ImageFont.truetype(font_path, size)
+            PROFILER.count("fonts_loaded")
+            self._fonts[key] = font
+        else:
+            self.hits += 1
+            PROFILER.count("font_cache_hits")
+        return font
+
+    def stats(self):
+        return {"fonts": len(self._fonts), "hits": self.hits, "misses": self.misses}
+
+
+class TextMetricsCache:
+    """Bounded LRU cache of text bounding boxes keyed by (font, text, stroke)."""
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def textbbox(self, font, text, stroke_width=0):
+        """Return the (left, top, right, bottom) box of text drawn at (0, 0)."""
+        key = (font.path, font.size, text, stroke_width)
+        bbox = self._entries.get(key)
+        if bbox is not None:
+            self.hits += 1
+            PROFILER.count("metrics_cache_hits")
+            self._entries.move_to_end(key)
+            return bbox
+
+        self.misses += 1
+        PROFILER.count("textbbox_calls")
+        bbox = font.getbbox(text, stroke_width=stroke_width)
+        self._entries[key] = bbox
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return bbox
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class LayoutCache:
+    """Bounded LRU of sentence layouts, so the resolutions of a multi-resolution run measure each line once."""
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Return the layout stored under key, calling build() for it on first use."""
+        layout = self._entries.get(key)
+        if layout is not None:
+            self.hits += 1
+            PROFILER.count("layout_cache_hits")
+            self._entries.move_to_end(key)
+            return layout
+
+        self.misses += 1
+        layout = self._entries[key] = build()
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return layout
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by every ImageSubtitleCreator in the process
+FONT_REGISTRY = FontRegistry()
+TEXT_METRICS = TextMetricsCache()
+SENTENCE_LAYOUTS = LayoutCache()
+
+# Font sizes, margins, strokes and layouts are in pixels of a frame this high, and scaled to the output
+REFERENCE_HEIGHT = 1080
+
+
+class RenderError(Exception):
+    """Raised after a batch when one or more sentences failed to render."""
+    def __init__(self, failures):
+        self.failures = failures  # [(index, message), ...]
+        lines = "\n".join(f"  sentence_{index + 1} (line {index + 1}): {message}" for index, message in failures)
+        super().__init__(f"{len(failures)} sentence(s) failed to render:\n{lines}")
+
+
+# Sidecar written next to the images; create_xmeml uses it to place each clip
+MANIFEST_NAME = "subtitle_images.json"
+
+
+def write_manifest(output_dir, entries, width, height, font=None):
+    """Write the per-sentence file names and placement offsets for the XML stage."""
+    manifest = {"width": width, "height": height, "font": font, "images": entries}
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    return manifest_path
+
+
+def load_manifest_entries(output_dir):
+    """Entries of the previous run keyed by file name, or {} when there is no usable manifest."""
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            images = json.load(f)["images"]
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {entry["file"]: entry for entry in images}
+
+
+def remove_orphans(output_dir, previous, entries):
+    """Delete images of the previous run that the new manifest no longer references."""
+    current = {entry["file"] for entry in entries}
+    removed = 0
+    for file_name in previous:
+        if file_name not in current:
+            try:
+                os.remove(os.path.join(output_dir, file_name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+def _reraise(error):
+    raise error
+
+
+def _completed(func):
+    """Run func now and wrap its outcome in a Future, like the --jobs path returns."""
+    future = Future()
+    try:
+        future.set_result(func())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+# Creators of a --jobs worker process keyed by their settings, so a worker keeps its fonts warm
+# across every batch and project it renders for
+_worker_creators = {}
+
+
+def _worker_creator(settings):
+    key = json.dumps(settings, sort_keys=True)
+    creator = _worker_creators.get(key)
+    if creator is None:
+        creator = _worker_creators[key] = ImageSubtitleCreator(**settings)
+    return creator
+
+
+def _worker_creator_with_layout(settings, kanji_ruby_pairs, layout):
+    # The layout was measured in the main process, where every resolution shares it
+    creator = _worker_creator(settings)
+    creator.layouts.get(creator.layout_key(kanji_ruby_pairs), lambda: layout)
+    return creator
+
+
+def _render_in_worker(settings, kanji_ruby_pairs, layout, index):
+    return _worker_creator_with_layout(settings, kanji_ruby_pairs, layout).render_sentence(kanji_ruby_pairs, index)
+
+
+def _crop_in_worker(settings, kanji_ruby_pairs, layout, index):
+    return _worker_creator_with_layout(settings, kanji_ruby_pairs, layout).crop_sentence(kanji_ruby_pairs)
+
+
+# One measured kanji/ruby pair; x and ruby_x are relative to the start of the line
+LayoutSegment = namedtuple("LayoutSegment", "kanji ruby x kanji_width ruby_x ruby_width ruby_height")
+
+
+class SentenceLayout:
+    """
+    Measured geometry of one sentence, reusable by every output format without measuring again.
+    Measured at REFERENCE_HEIGHT, so one layout serves every output resolution (see scaled()).
+    """
+    # Measurements the old two-pass renderer made per segment: the kanji twice and the ruby once
+    LEGACY_MEASURES_PER_SEGMENT = 3
+
+    def __init__(self, segments, width, measure_calls):
+        self.segments = segments
+        self.width = width  # Total advance, including the spacing after every segment
+        self.measure_calls = measure_calls
+
+    @property
+    def measure_calls_saved(self):
+        return self.LEGACY_MEASURES_PER_SEGMENT * len(self.segments) - self.measure_calls
+
+    def scaled(self, scale):
+        """The same layout in pixels of a frame scale times REFERENCE_HEIGHT high."""
+        if scale == 1:
+            return self
+        segments = [segment._replace(x=segment.x * scale, kanji_width=segment.kanji_width * scale,
+                                     ruby_x=segment.ruby_x * scale, ruby_width=segment.ruby_width * scale,
+                                     ruby_height=segment.ruby_height * scale)
+                    for segment in self.segments]
+        return SentenceLayout(segments, self.width * scale, self.measure_calls)
 
 
 class ImageSubtitleCreator:
-    def __init__(self, font_name, font_size, ruby_size, vertical_margin, text_color, stroke_color, stroke_width, output_dir):
+    def __init__(self, font_name, font_size, ruby_size, vertical_margin, text_color, stroke_color, stroke_width, output_dir,
+                 crop=False, segment_spacing=20, glyph_cache=False, compress_level=DEFAULT_COMPRESS_LEVEL,
+                 quantize=False, width=1920, height=1080):
         self.font_name = font_name
         self.font_size = font_size
         self.ruby_size = ruby_size
@@ -15,106 +237,415 @@ class ImageSubtitleCreator:
         self.stroke_color = stroke_color
         self.stroke_width = stroke_width
         self.output_dir = output_dir
+        self.crop = crop
+        self.segment_spacing = segment_spacing
+        self.glyph_cache = glyph_cache
+        self.compress_level = compress_level
+        self.quantize = quantize
+        # Output frame; every size above is for a REFERENCE_HEIGHT frame and drawn scaled by this much
+        self.width = width
+        self.height = height
+        self.scale = height / REFERENCE_HEIGHT
+        self.writer = None  # PngWriter set by ImageBuild to save images in the background
+        self._font_signature = None
+        self.fonts = FONT_REGISTRY
+        self.metrics = TEXT_METRICS
+        self.layouts = SENTENCE_LAYOUTS
+        self.layout_stats = {"lines": 0, "measure_calls": 0, "measure_calls_saved": 0}
 
-    def render_sentence_image(self, kanji_ruby_pairs, index):
-        """Render a single image with kanji and ruby for the entire sentence."""
-        # Load fonts
-        font_path = f"{self.font_name}.ttf"
-        font_kanji = ImageFont.truetype(font_path, self.font_size)
-        font_ruby = ImageFont.truetype(font_path, self.ruby_size)
+    def settings(self):
+        """Constructor arguments, used to rebuild the creator inside worker processes."""
+        return {
+            "font_name": self.font_name,
+            "font_size": self.font_size,
+            "ruby_size": self.ruby_size,
+            "vertical_margin": self.vertical_margin,
+            "text_color": self.text_color,
+            "stroke_color": self.stroke_color,
+            "stroke_width": self.stroke_width,
+            "output_dir": self.output_dir,
+            "crop": self.crop,
+            "segment_spacing": self.segment_spacing,
+            "glyph_cache": self.glyph_cache,
+            "compress_level": self.compress_level,
+            "quantize": self.quantize,
+            "width": self.width,
+            "height": self.height,
+        }
 
-        # Calculate image dimensions
-        width, height = 1920, 1080
-        image = Image.new("RGBA", (width, height), (255, 255, 255, 0))
-        draw = ImageDraw.Draw(image)
+    def scaled(self, size):
+        """A size in REFERENCE_HEIGHT pixels, in pixels of the output frame."""
+        return size if self.scale == 1 else max(round(size * self.scale), 1 if size else 0)
 
-        # Calculate total sentence width to center horizontally
-        x_offset = 50  # Starting x-position
-        line_width = 0
-        line_height = self.font_size + self.ruby_size + 10  # Combined height for ruby and kanji
-        for pair in kanji_ruby_pairs:
-            kanji = pair["kanji"]
-            kanji_width, _ = draw.textbbox((0, 0), kanji, font=font_kanji)[2:4]
-            line_width += kanji_width + 20  # Add spacing between characters
+    @property
+    def font_path(self):
+        return f"{self.font_name}.ttf"
+
+    def font_signature(self):
+        """mtime and size of the font file, so replacing the TTF invalidates its images."""
+        if self._font_signature is None:
+            try:
+                stat = os.stat(self.font_path)
+                self._font_signature = {"path": self.font_path, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+            except OSError:
+                self._font_signature = {"path": self.font_path}
+        return self._font_signature
+
+    def sentence_key(self, kanji_ruby_pairs):
+        """Content hash of a sentence plus every setting (and the font file) that affects its pixels."""
+        style = self.settings()
+        # The compression level does not change pixels; the frame size is part of the payload already
+        del style["output_dir"], style["compress_level"], style["width"], style["height"]
+        pairs = [(pair.kanji, pair.ruby) for pair in kanji_ruby_pairs]
+        payload = json.dumps([style, self.font_signature(), self.width, self.height, pairs],
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def cache_stats(self):
+        """Hit/miss counters of the font registry and text-metrics cache, and layout measure counts."""
+        stats = {"fonts": self.fonts.stats(), "metrics": self.metrics.stats(), "layout": dict(self.layout_stats),
+                 "layouts": self.layouts.stats()}
+        if self.glyph_cache:
+            import glyph_raster
+            stats["glyphs"] = glyph_raster.GLYPH_CACHE.stats()
+        return stats
+
+    def layout_sentence(self, kanji_ruby_pairs):
+        """
+        Measure a sentence once, at REFERENCE_HEIGHT; drawing and the other output formats only read
+        the result. Creators with the same fonts and spacing share it, whatever their resolution.
+        """
+        key = self.layout_key(kanji_ruby_pairs)
+        return self.layouts.get(key, lambda: self._measure_sentence(kanji_ruby_pairs))
 
-        x_start = (width - line_width) // 2  # Center horizontally
-        y_offset = height - self.vertical_margin  # Vertical alignment
+    def layout_key(self, kanji_ruby_pairs):
+        """Everything a layout depends on: the fonts, the spacing and the text, not the resolution."""
+        return (self.font_path, self.font_size, self.ruby_size, self.segment_spacing,
+                tuple((pair.kanji, pair.ruby) for pair in kanji_ruby_pairs))
 
-        # Render each kanji-ruby pair sequentially
+    @traced("layout")
+    def _measure_sentence(self, kanji_ruby_pairs):
+        font_kanji = self.fonts.get(self.font_path, self.font_size)
+        font_ruby = self.fonts.get(self.font_path, self.ruby_size)
+        measured = {}
+
+        def measure(font, text):
+            key = (font.size, text)
+            size = measured.get(key)
+            if size is None:
+                size = measured[key] = self.metrics.textbbox(font, text)[2:4]
+            return size
+
+        segments = []
+        x = 0
         for pair in kanji_ruby_pairs:
-            kanji = pair["kanji"]
-            ruby = pair["ruby"]
+            kanji, ruby = pair.kanji, pair.ruby
+            kanji_width, _ = measure(font_kanji, kanji)
+            ruby_width, ruby_height = measure(font_ruby, ruby)
+            # Ruby is centered over its kanji
+            segments.append(LayoutSegment(kanji, ruby, x, kanji_width, x + (kanji_width - ruby_width) / 2,
+                                          ruby_width, ruby_height))
+            x += kanji_width + self.segment_spacing
+
+        layout = SentenceLayout(segments, x, len(measured))
+        self.layout_stats["lines"] += 1
+        self.layout_stats["measure_calls"] += layout.measure_calls
+        self.layout_stats["measure_calls_saved"] += layout.measure_calls_saved
+        return layout
 
-            # Measure text sizes
-            ruby_width, ruby_height = draw.textbbox((0, 0), ruby, font=font_ruby)[2:4]
-            kanji_width, kanji_height = draw.textbbox((0, 0), kanji, font=font_kanji)[2:4]
+    @traced("draw")
+    def draw_sentence(self, kanji_ruby_pairs):
+        """Draw a sentence onto a transparent full-frame RGBA image."""
+        layout = self.layout_sentence(kanji_ruby_pairs).scaled(self.scale)
+        font_kanji = self.fonts.get(self.font_path, self.scaled(self.font_size))
+        font_ruby = self.fonts.get(self.font_path, self.scaled(self.ruby_size))
+        stroke_width = self.scaled(self.stroke_width)
 
-            # Adjust horizontal alignment for ruby
-            ruby_x = x_start + (kanji_width - ruby_width) / 2
+        # Calculate image dimensions
+        width, height = self.width, self.height
+        x_start = (width - layout.width) // 2  # Center horizontally
+        y_offset = height - self.scaled(self.vertical_margin)  # Vertical alignment
+
+        if self.glyph_cache:
+            return self._composite_sentence(layout, font_kanji, font_ruby, stroke_width, x_start, y_offset)
 
+        image = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+        draw = ImageDraw.Draw(image)
+
+        # Render each kanji-ruby pair from the measured layout
+        for segment in layout.segments:
             # Draw ruby above kanji
-            draw.text((ruby_x, y_offset - ruby_height), ruby, fill=self.text_color, font=font_ruby,
-                    stroke_width=self.stroke_width, stroke_fill=self.stroke_color)
+            draw.text((x_start + segment.ruby_x, y_offset - segment.ruby_height), segment.ruby, fill=self.text_color,
+                      font=font_ruby, stroke_width=stroke_width, stroke_fill=self.stroke_color)
             # Draw kanji below ruby
-            draw.text((x_start, y_offset), kanji, fill=self.text_color, font=font_kanji,
-                    stroke_width=self.stroke_width, stroke_fill=self.stroke_color)
+            draw.text((x_start + segment.x, y_offset), segment.kanji, fill=self.text_color, font=font_kanji,
+                      stroke_width=stroke_width, stroke_fill=self.stroke_color)
+        return image
+
+    def _composite_sentence(self, layout, font_kanji, font_ruby, stroke_width, x_start, y_offset):
+        """Same drawing as draw_sentence, from cached glyph masks blended with NumPy."""
+        import glyph_raster
+
+        layers = []
+        for segment in layout.segments:
+            layers += glyph_raster.text_layers(glyph_raster.GLYPH_CACHE,
+                                               (x_start + segment.ruby_x, y_offset - segment.ruby_height),
+                                               segment.ruby, font_ruby, self.text_color, stroke_width,
+                                               self.stroke_color)
+            layers += glyph_raster.text_layers(glyph_raster.GLYPH_CACHE, (x_start + segment.x, y_offset),
+                                               segment.kanji, font_kanji, self.text_color, stroke_width,
+                                               self.stroke_color)
+        return glyph_raster.render_layers(layers, self.width, self.height)
+
+    def render_sentence_image(self, kanji_ruby_pairs, index):
+        """Render a single image with kanji and ruby for the entire sentence."""
+        entry = self.render_sentence(as_segments(kanji_ruby_pairs), index)
+        return os.path.join(self.output_dir, entry["file"])
+
+    def crop_sentence(self, kanji_ruby_pairs):
+        """Draw a sentence and crop it to the drawn pixels, returning (image, x, y) of the crop in the frame."""
+        image = self.draw_sentence(kanji_ruby_pairs)
+        bbox = image.getchannel("A").getbbox()
+        if bbox is None:
+            bbox = (0, 0, 1, 1)  # Nothing drawn, keep a single transparent pixel
+        return image.crop(bbox), bbox[0], bbox[1]
+
+    @traced("render")
+    def render_sentence(self, kanji_ruby_pairs, index):
+        """Render and save one sentence, returning its manifest entry (file name and placement)."""
+        # Crop to the drawn pixels; the offset puts the clip back in place on the timeline
+        if self.crop:
+            image, x, y = self.crop_sentence(kanji_ruby_pairs)
+        else:
+            image, x, y = self.draw_sentence(kanji_ruby_pairs), 0, 0
+
+        # Save the image, in the background when a writer is set
+        file_name = f"sentence_{index + 1}.png"
+        output_path = os.path.join(self.output_dir, file_name)
+        if self.writer is not None:
+            self.writer.submit(image, output_path, index)
+        else:
+            size, seconds = save_png(image, output_path, self.compress_level, self.quantize)
+            print(f"Saved: {output_path} ({size:,} bytes, {seconds * 1000:.1f} ms)")
+        return {"file": file_name, "x": x, "y": y, "width": image.width, "height": image.height,
+                "compress_level": self.compress_level}
+
+    def generate_images(self, parsed_data, jobs=1, force=False, atlas=False):
+        """Generate images for each sentence in the parsed data.
+
+        With jobs > 1 the sentences are spread over a process pool. Paths are
+        returned in input order either way; sentences that fail are collected
+        and reported together in a RenderError once the rest have been saved.
+        See ImageBuild for de-duplication and reuse of the previous run, and
+        for atlas, which packs the lines onto a few atlas pages instead.
+        Sentences may also be given in the old dict form of parse_json.
+        """
+        entries = []
+        failures = []
+        with ImageBuild(self, jobs=jobs, force=force, atlas=atlas) as build:
+            for index, sentence, entry, error in build.run(map(as_sentence, parsed_data)):
+                if error is not None:
+                    failures.append((index, error))
+                else:
+                    entries.append(entry)
+
+            if failures:
+                raise RenderError(failures)
+            build.finish(entries)
+        return [os.path.join(self.output_dir, entry["file"]) for entry in entries]
+
+
+class ImageBuild:
+    """One incremental, de-duplicated render of a stream of sentences.
+
+    Repeated sentences (same sentence_key) are rendered once, as the file of
+    their first occurrence, and every repeat points at that file. The previous
+    MANIFEST_NAME in the output directory acts as a build manifest: a sentence
+    whose file is still on disk with the same key is not rendered again unless
+    force is set, and finish() deletes images the new manifest no longer uses.
+    The old manifest is deleted before the first image is overwritten, so a run
+    that fails or is interrupted never leaves new pixels under old keys.
+
+    With atlas, every distinct sentence is cropped and packed onto frame-sized
+    atlas pages (see atlas.AtlasWriter) and its entry records the crop region.
+    The pages are written again on every run.
 
-            # Move x_start for the next kanji-ruby pair
-            x_start += kanji_width + 20  # Add spacing between characters
+    Images drawn in this process (every image without jobs, and the atlas
+    pages) are encoded by a png_writer.PngWriter thread while the next line
+    is drawn; finish() waits for it and reports images that failed to save.
+    """
+    def __init__(self, creator, jobs=1, force=False, atlas=False, executor=None):
+        self.creator = creator
+        self.previous = load_manifest_entries(creator.output_dir)
+        self.reuse = {} if force or atlas else self.previous
+        self.results = {}  # sentence_key -> future of the manifest entry (or crop) for its first occurrence
+        self.rendered = 0
+        self.reencoded = 0
+        self.manifest_removed = False
+        self.atlas = None
+        self.placed = {}  # sentence_key -> atlas entry
+        self.writer = PngWriter(creator.compress_level, creator.quantize)
+        if atlas:
+            from atlas import AtlasWriter
+            self.atlas = AtlasWriter(creator.output_dir, creator.width, creator.height, writer=self.writer)
+        self.settings = creator.settings()
+        # A shared executor (see batch.py) stays open for the next build; jobs is its worker count
+        self.executor = executor
+        self.owns_executor = executor is None
+        self.window = 0  # Sentences rendered ahead of the one being yielded
+        if executor is None and jobs > 1:
+            self.executor = ProcessPoolExecutor(max_workers=jobs)
+        if self.executor is not None:
+            self.window = jobs * 4
+        else:
+            creator.writer = self.writer
 
-        # Save the image
-        output_path = os.path.join(self.output_dir, f"sentence_{index + 1}.png")
-        image.save(output_path)
-        print(f"Saved: {output_path}")
-        return output_path
+    def __enter__(self):
+        return self
 
-    def generate_images(self, parsed_data):
-        """Generate images for each sentence in the parsed data."""
-        image_paths = []
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.executor is not None and self.owns_executor:
+            self.executor.shutdown()
+        self.executor = None
+        self.writer.close()
+        self.creator.writer = None
+
+    def run(self, parsed_data):
+        """Yield (index, sentence, entry, error) in input order, reading parsed_data lazily.
+
+        error is None on success, otherwise a message and entry is None.
+        """
+        pending = deque()
         for index, sentence in enumerate(parsed_data):
-            kanji_ruby_pairs = sentence["kanji_ruby_pairs"]
-            image_path = self.render_sentence_image(kanji_ruby_pairs, index)
-            image_paths.append(image_path)
-        return image_paths
-
-
-def parse_json(input_data):
-    """Parse the JSON input into a list of sentences with kanji and ruby components."""
-    parsed_data = []
-    ruby_pattern = re.compile(r"<ruby>(.*?)<rt>(.*?)</rt></ruby>")
-
-    for html in input_data:
-        kanji_ruby_pairs = []
-        # Split into terms while preserving order
-        terms = re.split(r"(<ruby>.*?</ruby>)", html)
-
-        for term in terms:
-            if ruby_pattern.match(term):
-                # Extract kanji and ruby
-                kanji, ruby = ruby_pattern.findall(term)[0]
-                kanji_ruby_pairs.append({"kanji": kanji.strip(), "ruby": ruby.strip()})
+            PROFILER.set_line(index + 1)
+            pending.append((index, sentence, self._submit(sentence.kanji_ruby_pairs, index)))
+            while len(pending) > self.window:
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    def _submit(self, kanji_ruby_pairs, index):
+        try:
+            key = self.creator.sentence_key(kanji_ruby_pairs)
+        except Exception as e:
+            return None, _completed(lambda: _reraise(e))
+        if key in self.results:
+            return key, self.results[key]
+
+        file_name = f"sentence_{index + 1}.png"
+        entry = self.reuse.get(file_name)
+        if entry is not None and entry.get("key") == key and \
+                os.path.exists(os.path.join(self.creator.output_dir, file_name)):
+            if entry.get("compress_level") == self.creator.compress_level:
+                PROFILER.count("images_reused")
+                future = _completed(lambda: entry)
             else:
-                # Plain text outside ruby tags
-                plain_text = re.sub(r"<.*?>", "", term).strip()  # Remove any stray HTML tags
-                if plain_text:
-                    kanji_ruby_pairs.append({"kanji": plain_text, "ruby": ""})
+                # Same pixels saved at another --compress-level: encode the file again without drawing it
+                self._remove_manifest()
+                future = _completed(lambda: self._reencode(entry, index))
+            self.results[key] = future
+            return key, future
 
-        parsed_data.append({"kanji_ruby_pairs": kanji_ruby_pairs})
-    return parsed_data
+        self._remove_manifest()
+        self.rendered += 1
+        if self.executor is not None:
+            worker = _crop_in_worker if self.atlas is not None else _render_in_worker
+            try:
+                # Measured here, where every resolution shares it; a line that fails fails on its own
+                layout = self.creator.layout_sentence(kanji_ruby_pairs)
+            except Exception as e:
+                future = _completed(lambda: _reraise(e))
+            else:
+                future = self.executor.submit(worker, self.settings, kanji_ruby_pairs, layout, index)
+        elif self.atlas is not None:
+            future = _completed(lambda: self.creator.crop_sentence(kanji_ruby_pairs))
+        else:
+            future = _completed(lambda: self.creator.render_sentence(kanji_ruby_pairs, index))
+        self.results[key] = future
+        return key, future
 
+    def _reencode(self, entry, index):
+        path = os.path.join(self.creator.output_dir, entry["file"])
+        with Image.open(path) as image:
+            image.load()
+        self.writer.submit(image, path, index)
+        self.reencoded += 1
+        PROFILER.count("images_reencoded")
+        return dict(entry, compress_level=self.creator.compress_level)
 
+    def _remove_manifest(self):
+        """Forget the previous run on disk before overwriting any of its images; finish() writes the new one."""
+        if self.manifest_removed:
+            return
+        try:
+            os.remove(os.path.join(self.creator.output_dir, MANIFEST_NAME))
+        except FileNotFoundError:
+            pass
+        self.manifest_removed = True
 
-def process_subtitles(input_json, output_dir, font_name, font_size, ruby_size, vertical_margin, text_color, stroke_color, stroke_width):
-    """Process subtitles and create images."""
-    with open(input_json, 'r', encoding='utf-8') as f:
-        input_data = json.load(f)
+    def _collect(self, index, sentence, submitted):
+        key, future = submitted
+        try:
+            if self.atlas is not None:
+                return index, sentence, dict(self._place(key, future.result()), key=key), None
+            return index, sentence, dict(future.result(), key=key), None
+        except Exception as e:
+            return index, sentence, None, f"{type(e).__name__}: {e}"
 
-    parsed_data = parse_json(input_data)
+    def _place(self, key, cropped):
+        entry = self.placed.get(key)
+        if entry is None:
+            entry = self.placed[key] = self.atlas.add(*cropped)
+        return entry
+
+    def finish(self, entries):
+        """Write the manifest for entries and delete orphaned images of the previous run."""
+        creator = self.creator
+        if self.atlas is not None:
+            self.atlas.close()
+            print(f"Packed {len(self.placed)} lines into {len(self.atlas.pages)} atlas page(s)")
+        self.writer.close()
+        failures = self.writer.failures
+        if any(index is None for index, _, _ in failures):
+            raise OSError("; ".join(f"{path}: {message}" for _, path, message in failures))
+        if failures:
+            raise RenderError([(index, message) for index, _, message in failures])
+        stats = self.writer.stats()
+        if stats["images"]:
+            print(f"Encoded {stats['images']} images in the background: {stats['bytes']:,} bytes, "
+                  f"{stats['encode_seconds'] * 1000:.1f} ms")
+        write_manifest(creator.output_dir, entries, creator.width, creator.height, creator.font_signature())
+        removed = remove_orphans(creator.output_dir, self.previous, entries)
+        reused = len(self.results) - self.rendered - self.reencoded
+        print(f"Rendered {self.rendered} images, reused {reused} unchanged, re-encoded {self.reencoded}, "
+              f"removed {removed} orphaned ({len(entries)} sentences)")
+
+
+def process_subtitles(input_json, output_dir, font_name, font_size, ruby_size, vertical_margin, text_color, stroke_color, stroke_width,
+                      jobs=1, crop=False, force=False, segment_spacing=20, glyph_cache=False, atlas=False,
+                      compress_level=DEFAULT_COMPRESS_LEVEL, quantize=False):
+    """Process subtitles and create images; input_json may also be a ruby .txt or .jsonl (see ruby_input)."""
+    parsed_data = iter_sentences(read_ruby_input(input_json))
 
     creator = ImageSubtitleCreator(
-        font_name, font_size, ruby_size, vertical_margin, text_color, stroke_color, stroke_width, output_dir
+        font_name, font_size, ruby_size, vertical_margin, text_color, stroke_color, stroke_width, output_dir,
+        crop=crop, segment_spacing=segment_spacing, glyph_cache=glyph_cache, compress_level=compress_level,
+        quantize=quantize
     )
-    image_paths = creator.generate_images(parsed_data)
+    image_paths = creator.generate_images(parsed_data, jobs=jobs, force=force, atlas=atlas)
+
+    # Worker processes keep their own caches, so only the serial run has counters here
+    if jobs <= 1:
+        stats = creator.cache_stats()
+        print(f"Font cache: {stats['fonts']['hits']} hits, {stats['fonts']['misses']} misses | "
+              f"Metrics cache: {stats['metrics']['hits']} hits, {stats['metrics']['misses']} misses | "
+              f"Layout: {stats['layout']['measure_calls_saved']} measure calls saved "
+              f"over {stats['layout']['lines']} lines")
+        if glyph_cache:
+            print(f"Glyph cache: {stats['glyphs']['hits']} hits, {stats['glyphs']['misses']} misses")
     return image_paths
 
 
@@ -122,7 +653,7 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(description="Render furigana subtitles as images.")
-    parser.add_argument("input_json", help="Path to the input JSON file.")
+    parser.add_argument("input_json", help="Path to the input JSON file (or ruby HTML .txt, or .jsonl).")
     parser.add_argument("output_dir", help="Path to the output directory.")
     parser.add_argument("--font", required=True, help="Font name (without extension).")
     parser.add_argument("--font-size", type=int, default=48, help="Font size for kanji.")
@@ -131,23 +662,56 @@ def main():
     parser.add_argument("--text-color", default="black", help="Color of the text.")
     parser.add_argument("--stroke-color", default="white", help="Color of the stroke.")
     parser.add_argument("--stroke-width", type=int, default=2, help="Width of the stroke.")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of worker processes used for rendering.")
+    parser.add_argument("--crop", action="store_true",
+                        help="Crop each image to its text and store the offsets in the sidecar manifest.")
+    parser.add_argument("--atlas", action="store_true",
+                        help="Pack the cropped lines onto a few atlas images instead of saving one PNG per line.")
+    parser.add_argument("--segment-spacing", type=int, default=20,
+                        help="Horizontal gap in pixels between kanji/ruby segments.")
+    parser.add_argument("--glyph-cache", action="store_true",
+                        help="Composite cached glyph masks with NumPy instead of drawing text with PIL.")
+    parser.add_argument("--compress-level", type=int, default=DEFAULT_COMPRESS_LEVEL, choices=range(10),
+                        metavar="0-9", help="PNG zlib level: 0 is fastest, 9 is smallest (default: 6).")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Save 256-color palette PNGs, much smaller but with slightly banded outlines.")
+    parser.add_argument("--force", action="store_true",
+                        help="Render every image again instead of reusing unchanged ones from the last run.")
+    add_profile_argument(parser)
     args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
 
     # Create output directory
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Process subtitles
-    process_subtitles(
-        args.input_json,
-        args.output_dir,
-        args.font,
-        args.font_size,
-        args.ruby_size,
-        args.vertical_margin,
-        args.text_color,
-        args.stroke_color,
-        args.stroke_width
-    )
+    try:
+        process_subtitles(
+            args.input_json,
+            args.output_dir,
+            args.font,
+            args.font_size,
+            args.ruby_size,
+            args.vertical_margin,
+            args.text_color,
+            args.stroke_color,
+            args.stroke_width,
+            jobs=args.jobs,
+            crop=args.crop,
+            force=args.force,
+            segment_spacing=args.segment_spacing,
+            glyph_cache=args.glyph_cache,
+            atlas=args.atlas,
+            compress_level=args.compress_level,
+            quantize=args.quantize
+        )
+    except (RenderError, OSError, ValueError) as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    finally:
+        if args.profile:
+            PROFILER.report(args.profile)
 
 
 if __name__ == "__main__":
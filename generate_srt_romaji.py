@@ -1,7 +1,11 @@
-import json
+import argparse
 import re
-import sys
-from bs4 import BeautifulSoup
+from functools import lru_cache
+
+from generate_xml import iter_srt_timings
+from profiling import PROFILER, add_profile_argument, traced
+from ruby_input import read_ruby_input
+from ruby_sentence import iter_sentences, parse_sentence
 
 """
 This is not yet fully compatible with poorly structured HTML tags.
@@ -10,149 +14,150 @@ This is not yet fully compatible with poorly structured HTML tags.
 def extract_text_and_readings(html_text):
     """
     Extract both regular text and readings from HTML, maintaining the correct order.
+    Each term (<span class="term">) becomes one part: its readings, or the text itself outside ruby.
     """
-    soup = BeautifulSoup(html_text, 'html.parser')
-    text_parts = []
-
-    for span in soup.find_all('span', class_='term'):
-        ruby = span.find('ruby')
-        if ruby:
-            # Get the furigana
-            rt = ruby.find('rt')
-            if rt:
-                furigana = rt.get_text().strip()
-                # Get any text that follows the ruby element within the span
-                following_text = ruby.next_sibling
-                if following_text and isinstance(following_text, str):
-                    text_parts.append(furigana + following_text.strip())
-                else:
-                    text_parts.append(furigana)
-        else:
-            # Handle non-ruby text within spans
-            text = span.get_text().strip()
-            if text:
-                text_parts.append(text)
-
-    return text_parts
-
+    return list(parse_sentence(html_text).terms)
+
+HIRAGANA_TO_ROMAJI = {
+    'あ': 'a', 'い': 'i', 'う': 'u', 'え': 'e', 'お': 'o',
+    'か': 'ka', 'き': 'ki', 'く': 'ku', 'け': 'ke', 'こ': 'ko',
+    'さ': 'sa', 'し': 'shi', 'す': 'su', 'せ': 'se', 'そ': 'so',
+    'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
+    'な': 'na', 'に': 'ni', 'ぬ': 'nu', 'ね': 'ne', 'の': 'no',
+    'は': 'ha', 'ひ': 'hi', 'ふ': 'fu', 'へ': 'he', 'ほ': 'ho',
+    'ま': 'ma', 'み': 'mi', 'む': 'mu', 'め': 'me', 'も': 'mo',
+    'や': 'ya', 'ゆ': 'yu', 'よ': 'yo',
+    'ら': 'ra', 'り': 'ri', 'る': 'ru', 'れ': 're', 'ろ': 'ro',
+    'わ': 'wa', 'ゐ': 'wi', 'ゑ': 'we', 'を': 'wo', 'ん': 'n',
+    'が': 'ga', 'ぎ': 'gi', 'ぐ': 'gu', 'げ': 'ge', 'ご': 'go',
+    'ざ': 'za', 'じ': 'ji', 'ず': 'zu', 'ぜ': 'ze', 'ぞ': 'zo',
+    'だ': 'da', 'ぢ': 'ji', 'づ': 'zu', 'で': 'de', 'ど': 'do',
+    'ば': 'ba', 'び': 'bi', 'ぶ': 'bu', 'べ': 'be', 'ぼ': 'bo',
+    'ぱ': 'pa', 'ぴ': 'pi', 'ぷ': 'pu', 'ぺ': 'pe', 'ぽ': 'po',
+    'ゔ': 'vu',
+    'ぁ': 'a', 'ぃ': 'i', 'ぅ': 'u', 'ぇ': 'e', 'ぉ': 'o',
+    'ゃ': 'ya', 'ゅ': 'yu', 'ょ': 'yo', 'ゎ': 'wa', 'ゕ': 'ka', 'ゖ': 'ke',
+    'きゃ': 'kya', 'きゅ': 'kyu', 'きょ': 'kyo',
+    'しゃ': 'sha', 'しゅ': 'shu', 'しょ': 'sho', 'しぇ': 'she',
+    'ちゃ': 'cha', 'ちゅ': 'chu', 'ちょ': 'cho', 'ちぇ': 'che',
+    'にゃ': 'nya', 'にゅ': 'nyu', 'にょ': 'nyo',
+    'ひゃ': 'hya', 'ひゅ': 'hyu', 'ひょ': 'hyo',
+    'みゃ': 'mya', 'みゅ': 'myu', 'みょ': 'myo',
+    'りゃ': 'rya', 'りゅ': 'ryu', 'りょ': 'ryo',
+    'ぎゃ': 'gya', 'ぎゅ': 'gyu', 'ぎょ': 'gyo',
+    'じゃ': 'ja', 'じゅ': 'ju', 'じょ': 'jo', 'じぇ': 'je',
+    'ぢゃ': 'ja', 'ぢゅ': 'ju', 'ぢょ': 'jo',
+    'びゃ': 'bya', 'びゅ': 'byu', 'びょ': 'byo',
+    'ぴゃ': 'pya', 'ぴゅ': 'pyu', 'ぴょ': 'pyo',
+    # Combinations mostly seen in katakana loanwords
+    'ふぁ': 'fa', 'ふぃ': 'fi', 'ふぇ': 'fe', 'ふぉ': 'fo',
+    'てぃ': 'ti', 'でぃ': 'di', 'とぅ': 'tu', 'どぅ': 'du',
+    'うぃ': 'wi', 'うぇ': 'we', 'うぉ': 'wo', 'いぇ': 'ye',
+    'つぁ': 'tsa', 'つぃ': 'tsi', 'つぇ': 'tse', 'つぉ': 'tso',
+    'ゔぁ': 'va', 'ゔぃ': 'vi', 'ゔぇ': 've', 'ゔぉ': 'vo',
+}
+
+# Katakana ァ..ヶ sit exactly 0x60 code points above their hiragana
+KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+# Longest match first: digraphs, then single kana, then any other character as-is
+_KANA_TOKEN = re.compile(
+    "|".join(sorted(HIRAGANA_TO_ROMAJI, key=len, reverse=True)) + "|.",
+    re.DOTALL,
+)
+
+@lru_cache(maxsize=8192)
 def transliterate_to_romaji(text):
     """
     Transliterates a given text (hiragana/katakana) to romaji.
+    Small tsu doubles the following consonant, ー repeats the previous vowel and anything
+    that is not kana is kept as-is. Results are memoized, since lyrics repeat the same terms.
     """
-    hiragana_to_romaji = {
-        'あ': 'a', 'い': 'i', 'う': 'u', 'え': 'e', 'お': 'o',
-        'か': 'ka', 'き': 'ki', 'く': 'ku', 'け': 'ke', 'こ': 'ko',
-        'さ': 'sa', 'し': 'shi', 'す': 'su', 'せ': 'se', 'そ': 'so',
-        'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
-        'な': 'na', 'に': 'ni', 'ぬ': 'nu', 'ね': 'ne', 'の': 'no',
-        'は': 'ha', 'ひ': 'hi', 'ふ': 'fu', 'へ': 'he', 'ほ': 'ho',
-        'ま': 'ma', 'み': 'mi', 'む': 'mu', 'め': 'me', 'も': 'mo',
-        'や': 'ya', 'ゆ': 'yu', 'よ': 'yo',
-        'ら': 'ra', 'り': 'ri', 'る': 'ru', 'れ': 're', 'ろ': 'ro',
-        'わ': 'wa', 'を': 'wo', 'ん': 'n',
-        'が': 'ga', 'ぎ': 'gi', 'ぐ': 'gu', 'げ': 'ge', 'ご': 'go',
-        'ざ': 'za', 'じ': 'ji', 'ず': 'zu', 'ぜ': 'ze', 'ぞ': 'zo',
-        'だ': 'da', 'ぢ': 'ji', 'づ': 'zu', 'で': 'de', 'ど': 'do',
-        'ば': 'ba', 'び': 'bi', 'ぶ': 'bu', 'べ': 'be', 'ぼ': 'bo',
-        'ぱ': 'pa', 'ぴ': 'pi', 'ぷ': 'pu', 'ぺ': 'pe', 'ぽ': 'po',
-        'きゃ': 'kya', 'きゅ': 'kyu', 'きょ': 'kyo',
-        'しゃ': 'sha', 'しゅ': 'shu', 'しょ': 'sho',
-        'ちゃ': 'cha', 'ちゅ': 'chu', 'ちょ': 'cho',
-        'にゃ': 'nya', 'にゅ': 'nyu', 'にょ': 'nyo',
-        'ひゃ': 'hya', 'ひゅ': 'hyu', 'ひょ': 'hyo',
-        'みゃ': 'mya', 'みゅ': 'myu', 'みょ': 'myo',
-        'りゃ': 'rya', 'りゅ': 'ryu', 'りょ': 'ryo',
-        'ぎゃ': 'gya', 'ぎゅ': 'gyu', 'ぎょ': 'gyo',
-        'じゃ': 'ja', 'じゅ': 'ju', 'じょ': 'jo',
-        'びゃ': 'bya', 'びゅ': 'byu', 'びょ': 'byo',
-        'ぴゃ': 'pya', 'ぴゅ': 'pyu', 'ぴょ': 'pyo',
-        'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
-        'っ': '',  # Small tsu doubles the following consonant
-    }
-
-    romaji_text = ""
-    i = 0
-    while i < len(text):
-        # Handle small tsu (っ) for consonant doubling
-        if i < len(text) - 1 and text[i] == 'っ':
-            if i + 1 < len(text):
-                next_char = text[i + 1]
-                if next_char in hiragana_to_romaji:
-                    next_romaji = hiragana_to_romaji[next_char]
-                    if next_romaji[0] != 'n':  # Don't double 'n'
-                        romaji_text += next_romaji[0]  # Double the consonant
-            i += 1
+    romaji_parts = []
+    double_next = False
+    for token in _KANA_TOKEN.findall(text.translate(KATAKANA_TO_HIRAGANA)):
+        if token == 'っ':
+            double_next = True
             continue
 
-        # Check for digraphs (e.g., きゃ, しゃ, etc.)
-        if i + 1 < len(text) and text[i:i+2] in hiragana_to_romaji:
-            romaji_text += hiragana_to_romaji[text[i:i+2]]
-            i += 2
-        elif text[i] in hiragana_to_romaji:
-            romaji_text += hiragana_to_romaji[text[i]]
-            i += 1
-        else:
-            romaji_text += text[i]  # For unsupported characters, retain as-is
-            i += 1
-
-    return romaji_text
+        romaji = HIRAGANA_TO_ROMAJI.get(token)
+        if romaji is None:
+            if token == 'ー' and romaji_parts and romaji_parts[-1][-1] in 'aeiou':
+                romaji = romaji_parts[-1][-1]  # Long vowel mark
+            else:
+                romaji = token  # For unsupported characters, retain as-is
+        elif double_next and romaji[0] != 'n':  # Don't double 'n'
+            romaji_parts.append(romaji[0])
+        double_next = False
+        romaji_parts.append(romaji)
+
+    return ''.join(romaji_parts)
+
+def transliterate_many(texts):
+    """Transliterate an iterable of terms, returning a list in the same order."""
+    return [transliterate_to_romaji(text) for text in texts]
+
+@traced("romaji")
+def romaji_line(terms):
+    """
+    Join the romaji of a line's terms (Sentence.terms) with proper word spacing for SRT format.
+    """
+    # Convert each part to romaji and join the non-empty ones
+    return ' '.join(romaji for romaji in transliterate_many(terms) if romaji)
 
 def convert_html_to_romaji_srt(html_text):
     """
     Convert HTML ruby text into romaji with proper word spacing for SRT format.
     """
-    text_parts = extract_text_and_readings(html_text)
-
-    # Convert each part to romaji and join them
-    romaji_parts = []
-    for part in text_parts:
-        romaji = transliterate_to_romaji(part)
-        if romaji:  # Only add non-empty strings
-            romaji_parts.append(romaji)
-
-    return ' '.join(romaji_parts)
+    return romaji_line(extract_text_and_readings(html_text))
 
 def read_srt_timings(srt_path):
     """
-    Read timings from an existing SRT file.
+    Read the timing lines ("start --> end") of an existing SRT file.
     """
-    timings = []
-    with open(srt_path, 'r', encoding='utf-8') as srt_file:
-        for line in srt_file:
-            if '-->' in line:
-                timings.append(line.strip())
-    return timings
+    return [f"{start} --> {end}" for start, end in iter_srt_timings(srt_path)]
 
 def process_json_to_srt(json_path, output_srt_path, timings_srt_path):
     """
     Process the JSON file and generate a .srt file with romaji, using timings from an existing SRT file.
+    json_path may also be a ruby HTML .txt or a .jsonl file; either way it is read one line at a time.
     """
-    with open(json_path, 'r', encoding='utf-8') as json_file:
-        data = json.load(json_file)
-
-    timings = read_srt_timings(timings_srt_path)
+    sentences = iter_sentences(read_ruby_input(json_path))
+    timings = iter_srt_timings(timings_srt_path)
 
     with open(output_srt_path, 'w', encoding='utf-8') as srt_file:
-        for i, (ruby_html, timing) in enumerate(zip(data, timings), 1):
-            # Convert the HTML text to romaji
-            romaji_text = convert_html_to_romaji_srt(ruby_html)
+        for i, (sentence, (start, end)) in enumerate(zip(sentences, timings), 1):
+            PROFILER.set_line(i)
+            # Convert the terms of the line to romaji
+            romaji_text = romaji_line(sentence.terms)
 
             # Write the SRT entry
             srt_file.write(f"{i}\n")
-            srt_file.write(f"{timing}\n")
+            srt_file.write(f"{start} --> {end}\n")
             srt_file.write(f"{romaji_text}\n\n")
 
-if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python script.py <input_json> <output_srt> <timings_srt>")
-        sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description="Write romaji subtitles with the timings of an existing .srt.")
+    parser.add_argument("input_json", help="Ruby HTML input: JSON array, .txt or .jsonl.")
+    parser.add_argument("output_srt", help="Output romaji subtitle file.")
+    parser.add_argument("timings_srt", help="Subtitle file (SRT format) with the timings.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
 
-    input_json = sys.argv[1]
-    output_srt = sys.argv[2]
-    timings_srt = sys.argv[3]
+    input_json = args.input_json
+    output_srt = args.output_srt
+    timings_srt = args.timings_srt
+    if args.profile:
+        PROFILER.enable()
 
     try:
         process_json_to_srt(input_json, output_srt, timings_srt)
         print(f"Subtitle file saved as {output_srt}")
     except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file
+        print(f"An error occurred: {e}")
+    if args.profile:
+        PROFILER.set_counter("romaji_cache_hits", transliterate_to_romaji.cache_info().hits)
+        PROFILER.report(args.profile)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,93 +1,391 @@
 import os
+import re
+import json
 import argparse
-from xml.etree.ElementTree import Element, SubElement, ElementTree
-from datetime import timedelta
-import platform
+from itertools import chain
+from xml.etree.ElementTree import Element, SubElement, indent, tostring
+
+from profiling import PROFILER, add_profile_argument, traced
+
+# HH:MM:SS,mmm (a dot is accepted too); fewer than three digits are fractions, "5" meaning 500 ms
+TIMECODE_PATTERN = r"(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+TIMECODE = re.compile(TIMECODE_PATTERN)
+# A cue's timing line; anything after the end time (position settings) is ignored
+TIMING_LINE = re.compile(rf"^\s*({TIMECODE_PATTERN})\s*-->\s*({TIMECODE_PATTERN})")
+
+def timecode_to_ms(timecode):
+    """Convert an SRT timecode to whole milliseconds."""
+    match = TIMECODE.fullmatch(timecode.strip())
+    if match is None:
+        raise ValueError(f"Invalid SRT timecode: {timecode!r}")
+    h, m, s, fraction = match.groups()
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(fraction.ljust(3, "0"))
 
 def timecode_to_frames(timecode, fps=24):
     """Convert SRT timecode to frames."""
-    h, m, s = map(float, timecode.replace(",", ".").split(":"))
-    total_seconds = timedelta(hours=h, minutes=m, seconds=s).total_seconds()
-    return int(total_seconds * fps)
-
-def create_xmeml(images_folder, srt_file, output_xml, fps=24, width=1920, height=1080):
-    # Parse SRT file to get subtitles timing
-    subtitles = []
-    with open(srt_file, "r", encoding="utf-8") as file:
-        lines = file.readlines()
-        for i in range(0, len(lines), 4):  # SRT format blocks
-            start, end = lines[i+1].strip().split(" --> ")
-            start_frame = timecode_to_frames(start, fps)
-            end_frame = timecode_to_frames(end, fps)
-            subtitles.append((start_frame, end_frame))
-
-    # Fetch images in the folder
-    images = sorted(
-    [img for img in os.listdir(images_folder) if img.lower().endswith(('png'))],
-        key=lambda x: int(x.split("_")[-1].split(".")[0])  # Extract the number and sort numerically
-    )
-    if len(images) != len(subtitles):
-        raise ValueError(f"Number of images ({len(images)}) and subtitles ({len(subtitles)}) do not match!")
-
-    # Create XML structure
-    xmeml = Element("xmeml", version="5")
-    sequence = SubElement(xmeml, "sequence")
-    SubElement(sequence, "name").text = "Subtitle Project"
-    SubElement(sequence, "duration").text = str(subtitles[-1][1])
-    rate = SubElement(sequence, "rate")
-    SubElement(rate, "timebase").text = str(fps)
-    SubElement(rate, "ntsc").text = "false"
-
-    media = SubElement(sequence, "media")
-    video = SubElement(media, "video")
-    format_elem = SubElement(video, "format")
-    sample_characteristics = SubElement(format_elem, "samplecharacteristics")
-    SubElement(sample_characteristics, "width").text = str(width)
-    SubElement(sample_characteristics, "height").text = str(height)
-    SubElement(sample_characteristics, "pixelaspectratio").text = "square"
-    SubElement(sample_characteristics, "fielddominance").text = "none"
-    rate_elem = SubElement(sample_characteristics, "rate")
-    SubElement(rate_elem, "timebase").text = str(fps)
-    SubElement(rate_elem, "ntsc").text = "false"
-
-    track = SubElement(video, "track")
-
-    # Offset all clips to start from 0
-    timeline_offset = subtitles[0][0]  # First subtitle's start time (in frames)
-
-    for i, (start, end) in enumerate(subtitles):
+    return timecode_to_ms(timecode) * fps // 1000
+
+# Sidecar manifest written by generate_png_furigana next to the images
+MANIFEST_NAME = "subtitle_images.json"
+
+def iter_manifest(manifest_path, chunk_size=1 << 16):
+    """Read a manifest ({width, height, images: [{file, x, y, width, height[, crop]}]}) without loading
+    it whole: yield ("header", (key, value)) for each key other than "images", then ("image", entry)
+    for each of its images, in file order.
+
+    generate_png_furigana writes "images" last, so the header keys all come before the first image.
+    """
+    decoder = json.JSONDecoder()
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+
+        def peek():
+            # The next character after whitespace, reading more of the file when the buffer runs out
+            nonlocal buffer, pos
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                buffer, pos = f.read(chunk_size), 0
+                if not buffer:
+                    raise ValueError(f"{manifest_path} ends unexpectedly")
+
+        def expect(char):
+            nonlocal pos
+            if peek() != char:
+                raise ValueError(f"{manifest_path}: expected {char!r} at {buffer[pos:pos + 20]!r}")
+            pos += 1
+
+        def value():
+            # A value cut off by the end of the buffer fails to decode, or may be a number cut short
+            nonlocal buffer, pos
+            peek()
+            while True:
+                try:
+                    result, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer):
+                        break
+                except json.JSONDecodeError:
+                    pass
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    result, end = decoder.raw_decode(buffer, pos)
+                    break
+                buffer, pos = buffer[pos:] + chunk, 0
+            pos = end
+            return result
+
+        def skip_comma():
+            nonlocal pos
+            if peek() == ",":
+                pos += 1
+
+        expect("{")
+        while peek() != "}":
+            key = value()
+            expect(":")
+            if key != "images":
+                yield "header", (key, value())
+            else:
+                expect("[")
+                while peek() != "]":
+                    yield "image", value()
+                    skip_comma()
+                pos += 1
+            skip_comma()
+
+def shared_manifest_files(manifest_path):
+    """File names that more than one line of a manifest shows.
+
+    A repeated line points at the file of its first occurrence (sentence_<first line>.png), and the
+    lines of an atlas share its pages, so this takes one pass and keeps only the shared names.
+    """
+    shared = set()
+    index = 0
+    for kind, entry in iter_manifest(manifest_path):
+        if kind == "image":
+            index += 1
+            if "crop" in entry or entry["file"] != f"sentence_{index}.png":
+                shared.add(entry["file"])
+    return shared
+
+def placement_differs(placement, width, height):
+    """True for cropped images, which need a motion effect to sit where the full frame had them."""
+    if "crop" in placement:
+        return True
+    return (placement["x"], placement["y"], placement["width"], placement["height"]) != (0, 0, width, height)
+
+def file_size(placement):
+    """Pixel size of the image file itself: the whole atlas page for lines packed into an atlas."""
+    crop = placement.get("crop")
+    if crop is not None:
+        return crop["page_width"], crop["page_height"]
+    return placement["width"], placement["height"]
+
+def add_crop(clipitem, placement):
+    """Show only the line's region of an atlas page, with a Crop filter in percent of the page."""
+    crop = placement["crop"]
+    edges = {
+        "left": crop["left"] / crop["page_width"],
+        "right": (crop["page_width"] - crop["left"] - placement["width"]) / crop["page_width"],
+        "top": crop["top"] / crop["page_height"],
+        "bottom": (crop["page_height"] - crop["top"] - placement["height"]) / crop["page_height"],
+    }
+
+    filter_elem = SubElement(clipitem, "filter")
+    effect = SubElement(filter_elem, "effect")
+    SubElement(effect, "name").text = "Crop"
+    SubElement(effect, "effectid").text = "crop"
+    SubElement(effect, "effectcategory").text = "motion"
+    SubElement(effect, "effecttype").text = "motion"
+    SubElement(effect, "mediatype").text = "video"
+    for name, fraction in edges.items():
+        parameter = SubElement(effect, "parameter")
+        SubElement(parameter, "parameterid").text = name
+        SubElement(parameter, "name").text = name.capitalize()
+        SubElement(parameter, "valuemin").text = "0"
+        SubElement(parameter, "valuemax").text = "100"
+        SubElement(parameter, "value").text = f"{fraction * 100:.6f}"
+
+def add_placement(clipitem, placement, width, height):
+    """Move a cropped clip back to its original spot with a Basic Motion center.
+
+    The center is the clip's offset from the middle of the frame, as a fraction of the frame size.
+    A line on an atlas page is cropped first, and the whole page is moved so the region lands there.
+    """
+    center_x = placement["x"] + placement["width"] / 2
+    center_y = placement["y"] + placement["height"] / 2
+    crop = placement.get("crop")
+    if crop is not None:
+        add_crop(clipitem, placement)
+        center_x = placement["x"] - crop["left"] + crop["page_width"] / 2
+        center_y = placement["y"] - crop["top"] + crop["page_height"] / 2
+
+    filter_elem = SubElement(clipitem, "filter")
+    effect = SubElement(filter_elem, "effect")
+    SubElement(effect, "name").text = "Basic Motion"
+    SubElement(effect, "effectid").text = "basic"
+    SubElement(effect, "effectcategory").text = "motion"
+    SubElement(effect, "effecttype").text = "motion"
+    SubElement(effect, "mediatype").text = "video"
+    parameter = SubElement(effect, "parameter")
+    SubElement(parameter, "parameterid").text = "center"
+    SubElement(parameter, "name").text = "Center"
+    value = SubElement(parameter, "value")
+    SubElement(value, "horiz").text = f"{(center_x - width / 2) / width:.6f}"
+    SubElement(value, "vert").text = f"{(center_y - height / 2) / height:.6f}"
+
+class XmemlWriter:
+    """Write an xmeml timeline to disk one clip at a time.
+
+    Durations only known at the end (the sequence, and images shared by several clips) are
+    written into fixed-width slots, padded with whitespace between tags, and patched in close().
+    The writer remembers each shared image (its <file> id, longest clip and slots) until then.
+    shared_files is the set of image paths that more than one clip shows; an image outside it
+    gets its duration written at once and nothing is kept for it, so memory grows only with the
+    shared images. Without it every image is treated as possibly shared.
+    """
+    SLOT_WIDTH = 40
+    SLOT_PATTERN = re.compile(r"<duration>\{slot:([^}]*)\}</duration>")
+
+    def __init__(self, output_xml, fps=24, width=1920, height=1080, shared_files=None):
+        self.output_xml = output_xml
+        self.fps = fps
+        self.width = width
+        self.height = height
+        import platform  # Only needed here, and slow to import
+
+        self.file = open(output_xml, "wb")
+        self.windows = platform.system() == "Windows"
+        self.timeline_offset = None  # First subtitle's start time (in frames)
+        self.clip_count = 0
+        self.duration = 0
+        self.file_ids = {}  # image path -> id of its full <file> definition
+        self.file_durations = {}  # file id -> longest clip that uses it
+        self.slots = []  # (byte offset, slot name)
+        self.shared_files = shared_files
+        self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # A half-written timeline is of no use to an editor
+            self.file.close()
+            os.remove(self.output_xml)
+
+    def _write(self, text):
+        for i, part in enumerate(self.SLOT_PATTERN.split(text)):
+            if i % 2 == 0:
+                self.file.write(part.encode("utf-8"))
+            else:
+                self.slots.append((self.file.tell(), part))
+                self.file.write(b" " * self.SLOT_WIDTH)
+
+    def _write_header(self):
+        self._write(
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<xmeml version="5">\n'
+            "    <sequence>\n"
+            "        <name>Subtitle Project</name>\n"
+            "        <duration>{slot:sequence}</duration>\n"
+            "        <rate>\n"
+            f"            <timebase>{self.fps}</timebase>\n"
+            "            <ntsc>false</ntsc>\n"
+            "        </rate>\n"
+            "        <media>\n"
+            "            <video>\n"
+            "                <format>\n"
+            "                    <samplecharacteristics>\n"
+            f"                        <width>{self.width}</width>\n"
+            f"                        <height>{self.height}</height>\n"
+            "                        <pixelaspectratio>square</pixelaspectratio>\n"
+            "                        <fielddominance>none</fielddominance>\n"
+            "                        <rate>\n"
+            f"                            <timebase>{self.fps}</timebase>\n"
+            "                            <ntsc>false</ntsc>\n"
+            "                        </rate>\n"
+            "                    </samplecharacteristics>\n"
+            "                </format>\n"
+            "                <track>\n"
+        )
+
+    def pathurl(self, image_path):
+        path = os.path.abspath(image_path).replace("\\", "/")
+        return path if self.windows else f"file:///{path}"
+
+    @traced("xml_clip")
+    def add_clip(self, start, end, image_path, placement=None):
+        """Append a clip showing image_path between two SRT frame numbers.
+
+        Clips that repeat an image only reference the first clip's <file> by id.
+        placement is the image's manifest entry, if it has one.
+        """
+        if self.timeline_offset is None:
+            self.timeline_offset = start
+        self.clip_count += 1
+        i = self.clip_count
         duration = end - start
-        clip_start = start - timeline_offset  # Adjust start by offset
-        clip_end = end - timeline_offset  # Adjust end by offset
 
-        clipitem = SubElement(track, "clipitem", id=f"Clip-{i + 1}")
-        SubElement(clipitem, "name").text = f"Clip-{i + 1}"
-        SubElement(clipitem, "start").text = str(clip_start)
-        SubElement(clipitem, "end").text = str(clip_end)
+        clipitem = Element("clipitem", id=f"Clip-{i}")
+        SubElement(clipitem, "name").text = f"Clip-{i}"
+        SubElement(clipitem, "start").text = str(start - self.timeline_offset)
+        SubElement(clipitem, "end").text = str(end - self.timeline_offset)
         SubElement(clipitem, "in").text = "0"
         SubElement(clipitem, "out").text = str(duration)
 
-        file_elem = SubElement(clipitem, "file", id=f"file-{i + 1}")
-        SubElement(file_elem, "name").text = images[i]
-
-        if platform.system() == "Windows":
-            image_path = os.path.abspath(os.path.join(images_folder, images[i])).replace("\\", "/")
+        file_id = self.file_ids.get(image_path)
+        if file_id is not None:
+            SubElement(clipitem, "file", id=file_id)
+            self.file_durations[file_id] = max(self.file_durations[file_id], duration)
         else:
-            image_path = f"file:///{os.path.abspath(os.path.join(images_folder, images[i])).replace('\\', '/')}"
-        SubElement(file_elem, "pathurl").text = image_path
-        rate_elem = SubElement(file_elem, "rate")
-        SubElement(rate_elem, "timebase").text = str(fps)
-        SubElement(rate_elem, "ntsc").text = "false"
-        SubElement(file_elem, "duration").text = str(duration)
+            file_id = f"file-{i}"
+            if self.shared_files is None or image_path in self.shared_files:
+                self.file_ids[image_path] = file_id
+                self.file_durations[file_id] = duration
+                file_duration = f"{{slot:{file_id}}}"
+            else:
+                file_duration = str(duration)  # Shown by this clip only
+
+            file_elem = SubElement(clipitem, "file", id=file_id)
+            SubElement(file_elem, "name").text = os.path.basename(image_path)
+            SubElement(file_elem, "pathurl").text = self.pathurl(image_path)
+            rate_elem = SubElement(file_elem, "rate")
+            SubElement(rate_elem, "timebase").text = str(self.fps)
+            SubElement(rate_elem, "ntsc").text = "false"
+            SubElement(file_elem, "duration").text = file_duration
+
+            media_elem = SubElement(file_elem, "media")
+            video_elem = SubElement(media_elem, "video")
+            SubElement(video_elem, "duration").text = file_duration
+            if placement is not None:
+                file_characteristics = SubElement(video_elem, "samplecharacteristics")
+                file_width, file_height = file_size(placement)
+                SubElement(file_characteristics, "width").text = str(file_width)
+                SubElement(file_characteristics, "height").text = str(file_height)
+
+        if placement is not None and placement_differs(placement, self.width, self.height):
+            add_placement(clipitem, placement, self.width, self.height)
+
+        indent(clipitem, space="    ", level=5)
+        self._write(" " * 20 + tostring(clipitem, encoding="unicode") + "\n")
+        self.duration = end
+
+    @traced("xml_close")
+    def close(self):
+        """Finish the document and fill in the deferred durations."""
+        self._write(
+            "                </track>\n"
+            "            </video>\n"
+            "        </media>\n"
+            "    </sequence>\n"
+            "</xmeml>\n"
+        )
+        for offset, name in self.slots:
+            value = self.duration if name == "sequence" else self.file_durations[name]
+            self.file.seek(offset)
+            self.file.write(f"<duration>{value}</duration>".ljust(self.SLOT_WIDTH).encode("utf-8"))
+        PROFILER.count("bytes_written", self.file.seek(0, os.SEEK_END))
+        self.file.close()
+
+def iter_srt_timings(srt_file):
+    """Yield the (start, end) timecodes of an SRT file one cue at a time.
 
-        media_elem = SubElement(file_elem, "media")
-        video_elem = SubElement(media_elem, "video")
-        SubElement(video_elem, "duration").text = str(duration)
+    Only timing lines are looked at, so cue numbers may have gaps or be missing and a cue may
+    have any number of text lines.
+    """
+    with open(srt_file, "r", encoding="utf-8-sig") as file:
+        for line in file:
+            match = TIMING_LINE.match(line)
+            if match is not None:
+                yield match.group(1), match.group(6)
 
+def create_xmeml(images_folder, srt_file, output_xml, fps=24, width=None, height=None):
+    """The frame size defaults to the one the images were rendered for, or 1920x1080 without a manifest."""
+    # Read the images from the manifest one at a time, or list the folder for images rendered without one
+    manifest_path = os.path.join(images_folder, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        shared_files = {os.path.join(images_folder, name) for name in shared_manifest_files(manifest_path)}
+        manifest = iter_manifest(manifest_path)
+        header = {}
+        images = iter(())
+        for kind, item in manifest:
+            if kind == "image":
+                images = chain([(item["file"], item)], ((entry["file"], entry) for _, entry in manifest))
+                break
+            header[item[0]] = item[1]
+        width = width or header.get("width")
+        height = height or header.get("height")
+    else:
+        names = sorted(
+        [img for img in os.listdir(images_folder) if img.lower().endswith(('png'))],
+            key=lambda x: int(x.split("_")[-1].split(".")[0])  # Extract the number and sort numerically
+        )
+        images = ((name, None) for name in names)
+        shared_files = set()
 
-    # Write to XML file
-    tree = ElementTree(xmeml)
-    tree.write(output_xml, encoding="utf-8", xml_declaration=True)
+    # The SRT and the manifest are read one cue and image at a time, and every clip is written as soon as it is known
+    count = 0
+    clips = 0
+    with XmemlWriter(output_xml, fps, width or 1920, height or 1080, shared_files) as writer:
+        for start, end in iter_srt_timings(srt_file):
+            count += 1
+            image = next(images, None)
+            if image is None:
+                continue
+            file_name, placement = image
+            clips += 1
+            PROFILER.set_line(count)
+            writer.add_clip(timecode_to_frames(start, fps), timecode_to_frames(end, fps),
+                            os.path.join(images_folder, file_name), placement)
+        image_count = clips + sum(1 for _ in images)
+        if image_count != count:
+            raise ValueError(f"Number of images ({image_count}) and subtitles ({count}) do not match!")
     print(f"XMEML file successfully created: {output_xml}")
 
 def main():
@@ -106,13 +404,18 @@ def main():
     parser.add_argument(
         "-f", "--fps", type=int, default=24, help="Frames per second for the timeline (default: 24)."
     )
+    add_profile_argument(parser)
 
     args = parser.parse_args()
+    if args.profile:
+        PROFILER.enable()
 
     try:
         create_xmeml(args.images_folder, args.srt_file, args.output_xml, args.fps)
     except Exception as e:
         print(f"Error: {e}")
+    if args.profile:
+        PROFILER.report(args.profile)
 
 if __name__ == "__main__":
     main()
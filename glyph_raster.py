@@ -0,0 +1,147 @@
+"""
+Glyph raster cache and NumPy compositing, an alternative to calling ImageDraw.text per segment.
+
+Every (font, size, stroke width, character, subpixel offset) is rasterized once into an alpha
+mask. A line of text is built by taking the maximum of its glyph masks in NumPy, as FreeType
+rendering of a whole string does, and that line mask is blended with ImageDraw.bitmap, the same
+C blend ImageDraw.text uses for the mask it rasterizes. Without stroke the result is identical to
+ImageDraw.text; with stroke only pixels where the strokes of neighbouring glyphs overlap can
+differ, by a small amount.
+"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+
+from profiling import PROFILER
+
+# Subpixel start offsets are rounded to FreeType's 1/64 pixel
+SUBPIXEL_STEPS = 64
+
+
+class GlyphCache:
+    """Bounded LRU of glyph alpha masks plus the pen positions of the strings drawn with them."""
+    def __init__(self, maxsize=8192):
+        self.maxsize = maxsize
+        self._glyphs = OrderedDict()
+        self._pens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, entries, key, build):
+        value = entries.get(key)
+        if value is not None:
+            self.hits += 1
+            PROFILER.count("glyph_cache_hits")
+            entries.move_to_end(key)
+            return value
+
+        self.misses += 1
+        PROFILER.count("glyph_cache_misses")
+        value = entries[key] = build()
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return value
+
+    def glyph(self, font, char, stroke_width, subpixel):
+        """Return (mask as a uint8 array, (x, y) offset from the pen position) for one character."""
+        key = (font.path, font.size, stroke_width, char, subpixel)
+        return self._lookup(self._glyphs, key, lambda: _rasterize(font, char, stroke_width, subpixel))
+
+    def pen_positions(self, font, text):
+        """x of every character's pen position, kerning included, relative to the start of text."""
+        key = (font.path, font.size, text)
+        return self._lookup(self._pens, key, lambda: _pen_positions(font, text))
+
+    def stats(self):
+        return {"glyphs": len(self._glyphs), "hits": self.hits, "misses": self.misses}
+
+
+def _pen_positions(font, text):
+    # Each pen moves by the advance of the previous character plus the kerning of the pair:
+    # the length of the pair without the advance of the current character
+    positions = []
+    pen = 0
+    for i, char in enumerate(text):
+        if i:
+            pen += font.getlength(text[i - 1:i + 1]) - font.getlength(char)
+        positions.append(pen)
+    return tuple(positions)
+
+
+def _rasterize(font, char, stroke_width, subpixel):
+    start = (subpixel / SUBPIXEL_STEPS, 0)
+    try:
+        core, offset = font.getmask2(char, "L", stroke_width=stroke_width, start=start, stroke_filled=True)
+    except TypeError:
+        # Pillow before stroke_filled
+        core, offset = font.getmask2(char, "L", stroke_width=stroke_width, start=start)
+    mask = np.asarray(Image.Image()._new(core))
+    return mask, offset
+
+
+def to_ink(color):
+    """RGBA tuple for a PIL color name or tuple."""
+    ink = ImageColor.getrgb(color) if isinstance(color, str) else tuple(color)
+    return ink if len(ink) == 4 else ink + (255,)
+
+
+def text_mask(cache, font, xy, text, stroke_width=0):
+    """Alpha mask of text drawn at xy, as (mask, left, top), or None when nothing is drawn."""
+    x, y = xy
+    x_int, y_int = int(x), int(y)
+    x_frac = math.modf(x)[0]
+
+    placed = []
+    for char, pen in zip(text, cache.pen_positions(font, text)):
+        glyph_x = x_frac + pen
+        subpixel = round(math.modf(glyph_x)[0] * SUBPIXEL_STEPS) % SUBPIXEL_STEPS
+        mask, offset = cache.glyph(font, char, stroke_width, subpixel)
+        if mask.size:
+            placed.append((mask, x_int + int(glyph_x) + offset[0], y_int + offset[1]))
+    if not placed:
+        return None
+
+    left = min(px for _, px, _ in placed)
+    top = min(py for _, _, py in placed)
+    right = max(px + mask.shape[1] for mask, px, _ in placed)
+    bottom = max(py + mask.shape[0] for mask, _, py in placed)
+    line = np.zeros((bottom - top, right - left), dtype=np.uint8)
+    for mask, px, py in placed:
+        region = line[py - top:py - top + mask.shape[0], px - left:px - left + mask.shape[1]]
+        np.maximum(region, mask, out=region)
+    return line, left, top
+
+
+def text_layers(cache, xy, text, font, fill, stroke_width=0, stroke_fill=None):
+    """
+    The (mask, left, top, ink) layers ImageDraw.text(xy, text, fill, font, stroke_width=...,
+    stroke_fill=...) would blend, stroke first.
+    """
+    layers = []
+    ink = to_ink(fill)
+    if stroke_width:
+        stroke_ink = to_ink(stroke_fill) if stroke_fill is not None else ink
+        stroked = text_mask(cache, font, xy, text, stroke_width)
+        if stroked is not None:
+            layers.append((*stroked, stroke_ink))
+        if ink == stroke_ink:
+            return layers
+    filled = text_mask(cache, font, xy, text)
+    if filled is not None:
+        layers.append((*filled, ink))
+    return layers
+
+
+def render_layers(layers, width, height, color=(255, 255, 255, 0)):
+    """Blend layers, in order, over a width x height RGBA image of color, one line mask at a time."""
+    image = Image.new("RGBA", (width, height), color)
+    draw = ImageDraw.Draw(image)
+    for mask, x, y, ink in layers:
+        draw.bitmap((x, y), Image.fromarray(mask, "L"), fill=ink)
+    return image
+
+
+# Shared by every ImageSubtitleCreator in the process
+GLYPH_CACHE = GlyphCache()
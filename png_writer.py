@@ -0,0 +1,78 @@
+"""
+Write-behind PNG encoding: drawn images are handed to a background thread through a bounded
+queue, so drawing the next line overlaps with zlib compressing and writing the previous one.
+PIL releases the GIL while it encodes, so the two really run side by side.
+"""
+import os
+import queue
+import threading
+import time
+
+from PIL import Image
+
+from profiling import PROFILER, traced
+
+# PIL's own default for PNG
+DEFAULT_COMPRESS_LEVEL = 6
+
+
+@traced("encode")
+def save_png(image, output_path, compress_level=DEFAULT_COMPRESS_LEVEL, quantize=False):
+    """
+    Encode and save image, returning (bytes written, encode seconds).
+
+    quantize stores the image as a 256-color palette PNG, much smaller for subtitles that are
+    mostly transparent, at the cost of slightly banded anti-aliasing on the outlines.
+    """
+    start = time.perf_counter()
+    if quantize and image.mode != "P":  # A palette image re-encoded at another level is quantized already
+        image = image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+    image.save(output_path, compress_level=compress_level)
+    size = os.path.getsize(output_path)
+    PROFILER.count("images_encoded")
+    PROFILER.count("bytes_written", size)
+    return size, time.perf_counter() - start
+
+
+class PngWriter:
+    """Background thread that saves images in submission order, at most queue_size behind drawing."""
+    def __init__(self, compress_level=DEFAULT_COMPRESS_LEVEL, quantize=False, queue_size=4):
+        self.compress_level = compress_level
+        self.quantize = quantize
+        self.failures = []  # [(index, output_path, message), ...]
+        self.images = 0
+        self.bytes_written = 0
+        self.encode_seconds = 0.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="png-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, image, output_path, index=None):
+        """Queue image for saving; blocks while the queue is full. The image must not change afterwards."""
+        self._queue.put((image, output_path, index))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            image, output_path, index = item
+            PROFILER.set_line(None if index is None else index + 1)
+            try:
+                size, seconds = save_png(image, output_path, self.compress_level, self.quantize)
+            except Exception as e:
+                self.failures.append((index, output_path, f"{type(e).__name__}: {e}"))
+                continue
+            self.images += 1
+            self.bytes_written += size
+            self.encode_seconds += seconds
+            print(f"Saved: {output_path} ({size:,} bytes, {seconds * 1000:.1f} ms)")
+
+    def close(self):
+        """Wait until every queued image is on disk. failures lists the ones that could not be saved."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self):
+        return {"images": self.images, "bytes": self.bytes_written, "encode_seconds": self.encode_seconds}
@@ -0,0 +1,140 @@
+"""
+Timing spans and counters shared by every stage, dumped by the scripts' --profile flag as a Chrome
+trace (open it in chrome://tracing or https://ui.perfetto.dev) plus a summary table.
+
+Profiling is off unless a script enables it. While off, span() hands back one shared no-op
+context manager and count() returns at once, so the instrumentation costs a method call.
+Worker processes of --jobs keep their own, disabled, profiler; only the main process is traced.
+"""
+import functools
+import os
+import threading
+import time
+
+DEFAULT_PROFILE_PATH = "profile.json"
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        # list.append is atomic, so the PNG writer thread can record spans too
+        self.profiler.events.append((self.name, self.start, end, threading.get_ident(), self.args))
+        return False
+
+
+class Profiler:
+    """Spans (name, start, end, thread, args) and named counters of one process."""
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.counters = {}
+        self.origin = time.perf_counter()
+        self._local = threading.local()  # The line each thread is working on, see set_line()
+
+    def enable(self):
+        self.enabled = True
+        self.origin = time.perf_counter()
+
+    def span(self, name, **args):
+        """
+        Context manager timing one stage; args (e.g. frames=3) are shown with the span in the trace,
+        along with the line set by set_line() in this thread.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        line = getattr(self._local, "line", None)
+        if line is not None:
+            args.setdefault("line", line)
+        return _Span(self, name, args)
+
+    def set_line(self, number):
+        """Tag the spans this thread records from now on with line number (1-based), or None to stop."""
+        if self.enabled:
+            self._local.line = number
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_counter(self, name, value):
+        if self.enabled:
+            self.counters[name] = value
+
+    def trace(self):
+        """The spans and counters in Chrome's Trace Event Format."""
+        pid = os.getpid()
+        events = [
+            {"name": name, "cat": "stage", "ph": "X", "pid": pid, "tid": tid,
+             "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6, "args": args}
+            for name, start, end, tid, args in self.events
+        ]
+        end = max((event[2] for event in self.events), default=self.origin)
+        events.append({"name": "counters", "ph": "C", "pid": pid, "tid": 0, "ts": (end - self.origin) * 1e6,
+                       "args": dict(self.counters)})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summary(self):
+        """{name: (count, total seconds, max seconds)} of the spans, in order of first appearance."""
+        stages = {}
+        for name, start, end, _, _ in self.events:
+            count, total, longest = stages.get(name, (0, 0.0, 0.0))
+            stages[name] = (count + 1, total + end - start, max(longest, end - start))
+        return stages
+
+    def report(self, path=DEFAULT_PROFILE_PATH):
+        """Write the Chrome trace to path and print the summary table."""
+        import json
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.trace(), f)
+
+        print(f"{'stage':<16} {'count':>8} {'total ms':>12} {'mean ms':>10} {'max ms':>10}")
+        for name, (count, total, longest) in self.summary().items():
+            print(f"{name:<16} {count:>8} {total * 1000:>12.1f} {total / count * 1000:>10.2f} {longest * 1000:>10.2f}")
+        for name, value in sorted(self.counters.items()):
+            print(f"{name:<16} {value:>8,}")
+        print(f"Profile trace saved as {path}")
+
+
+# The profiler of this process, used by every stage
+PROFILER = Profiler()
+
+
+def add_profile_argument(parser):
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_PROFILE_PATH, metavar="TRACE_JSON",
+                        help=f"Time every stage and save a Chrome trace (default: {DEFAULT_PROFILE_PATH}).")
+
+
+def traced(name):
+    """Decorator timing every call of a function as a span called name."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with PROFILER.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,215 @@
+"""
+Resident render server on localhost: Python, PIL and the fonts are loaded once and the caches stay
+warm, so re-rendering a line after fixing a typo takes milliseconds instead of a cold start.
+
+Every request is a POST of a JSON object and gets a JSON object back:
+
+    /render  {"style": {...}, "lines": ["<ruby HTML>", ...], "first_index": 0, "return": "paths"}
+             style holds ImageSubtitleCreator's arguments (font_name, font_size, ..., output_dir).
+             Line i is saved as sentence_{first_index + i + 1}.png in output_dir, like the PNG stage,
+             and the response lists {"index", "path"} per line. When output_dir has a manifest from
+             the PNG stage, the line's entry (file, placement and key) is updated too, so the XML
+             stage places it right and the next PNG run does not mistake it for the old line; a
+             line that shared another line's image gets its own file first. With "return": "bytes"
+             nothing is saved and each line comes back as {"index", "png_base64"} instead.
+    /romaji  {"lines": ["<ruby HTML>", ...]} -> {"romaji": ["...", ...]}
+    /xml     {"images_folder": ..., "srt_file": ..., "output_xml": ..., "fps": 24} -> {"output_xml": ...}
+    /stats   {} -> cache statistics of every style used so far
+
+Requests are handled one at a time, since the caches are not thread-safe. The server only listens
+on 127.0.0.1, and since /render and /xml write files, it also refuses what a web page open in the
+browser could send it: a request must have Content-Type application/json (which a page cannot send
+to another origin without a preflight, and this server answers none), a Host header naming
+127.0.0.1 or localhost (against DNS rebinding), and the token the server made at launch in an
+X-Render-Token header. The token is printed and saved in token_path(port), readable by the user
+only, where request() picks it up. Use request() from another Python process, or any HTTP client.
+"""
+import argparse
+import base64
+import hmac
+import io
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from generate_png_furigana import MANIFEST_NAME, ImageSubtitleCreator, write_manifest
+from generate_srt_romaji import convert_html_to_romaji_srt, transliterate_to_romaji
+from generate_xml import create_xmeml
+from ruby_sentence import parse_sentence
+
+DEFAULT_PORT = 8765
+TOKEN_HEADER = "X-Render-Token"
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+
+
+class RenderService:
+    """The work behind each endpoint, with one ImageSubtitleCreator kept per style."""
+    def __init__(self):
+        self.creators = {}
+
+    def creator(self, style):
+        key = json.dumps(style, sort_keys=True)
+        creator = self.creators.get(key)
+        if creator is None:
+            creator = self.creators[key] = ImageSubtitleCreator(**style)
+        return creator
+
+    def render(self, request):
+        creator = self.creator(request["style"])
+        first_index = request.get("first_index", 0)
+        as_bytes = request.get("return", "paths") == "bytes"
+        images = []
+        for offset, html in enumerate(request["lines"]):
+            index = first_index + offset
+            pairs = parse_sentence(html).kanji_ruby_pairs
+            if as_bytes:
+                image = creator.crop_sentence(pairs)[0] if creator.crop else creator.draw_sentence(pairs)
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG", compress_level=creator.compress_level)
+                images.append({"index": index, "png_base64": base64.b64encode(buffer.getvalue()).decode("ascii")})
+            else:
+                images.append({"index": index, "path": self._render_file(creator, pairs, index)})
+        return {"images": images}
+
+    def _render_file(self, creator, pairs, index):
+        """Save line index like the PNG stage and point its entry of the manifest at the new image."""
+        output_dir = creator.output_dir
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)["images"]
+        except FileNotFoundError:
+            return creator.render_sentence_image(pairs, index)
+        if index >= len(entries):
+            raise ValueError(f"Line {index + 1} is not in {manifest_path} ({len(entries)} lines)")
+
+        # Repeated lines share the file of their first occurrence; give the others a copy of it first
+        file_name = f"sentence_{index + 1}.png"
+        for other, entry in enumerate(entries):
+            if other != index and entry["file"] == file_name:
+                own_name = f"sentence_{other + 1}.png"
+                shutil.copyfile(os.path.join(output_dir, file_name), os.path.join(output_dir, own_name))
+                entries[other] = dict(entry, file=own_name)
+
+        entry = creator.render_sentence(pairs, index)
+        entries[index] = dict(entry, key=creator.sentence_key(pairs))
+        write_manifest(output_dir, entries, creator.width, creator.height, creator.font_signature())
+        return os.path.join(output_dir, entry["file"])
+
+    def romaji(self, request):
+        return {"romaji": [convert_html_to_romaji_srt(html) for html in request["lines"]]}
+
+    def xml(self, request):
+        create_xmeml(request["images_folder"], request["srt_file"], request["output_xml"], request.get("fps", 24))
+        return {"output_xml": request["output_xml"]}
+
+    def stats(self, request):
+        return {
+            "styles": [dict(json.loads(key), cache_stats=creator.cache_stats())
+                       for key, creator in self.creators.items()],
+            "romaji": transliterate_to_romaji.cache_info()._asdict(),
+        }
+
+
+def token_path(port):
+    """Where the server listening on port saves its token."""
+    return os.path.join(tempfile.gettempdir(), f"furigana_render_server_{port}.token")
+
+
+class RenderServer(HTTPServer):
+    """HTTPServer on 127.0.0.1 holding the RenderService and the token every request must carry."""
+    def __init__(self, port=DEFAULT_PORT, token=None):
+        super().__init__(("127.0.0.1", port), RenderRequestHandler)
+        self.service = RenderService()
+        self.token = token or secrets.token_urlsafe(32)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    endpoints = {"/render": "render", "/romaji": "romaji", "/xml": "xml", "/stats": "stats"}
+
+    def do_POST(self):
+        refusal = self._refusal()
+        if refusal is not None:
+            return self._reply(*refusal)
+        endpoint = self.endpoints.get(self.path)
+        if endpoint is None:
+            return self._reply(404, {"error": f"Unknown endpoint {self.path}"})
+        start = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            response = getattr(self.server.service, endpoint)(request)
+        except (KeyError, TypeError, ValueError) as e:
+            return self._reply(400, {"error": f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            return self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+        response["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        self._reply(200, response)
+
+    def _refusal(self):
+        """(status, error) for a request that may come from a web page rather than a local client, else None."""
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            return 415, {"error": "Content-Type must be application/json"}
+        host = self.headers.get("Host", "")
+        if host.rsplit(":", 1)[0] not in LOCAL_HOSTS:
+            return 403, {"error": f"Host must be one of {', '.join(LOCAL_HOSTS)}"}
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.server.token):
+            return 403, {"error": f"Missing or wrong {TOKEN_HEADER} (see {token_path(self.server.server_port)})"}
+        return None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=DEFAULT_PORT):
+    """Serve on 127.0.0.1:port until interrupted, with a new token saved in token_path(port)."""
+    server = RenderServer(port)
+    path = token_path(server.server_port)
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+        f.write(server.token)
+    print(f"Render server listening on http://127.0.0.1:{server.server_port}")
+    print(f"{TOKEN_HEADER}: {server.token} (saved in {path})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(path)
+
+
+def request(endpoint, payload, port=DEFAULT_PORT, timeout=60, token=None):
+    """
+    POST payload to a running server and return its JSON response; errors raise urllib.error.HTTPError.
+    The token defaults to the one the server saved in token_path(port).
+    """
+    if token is None:
+        with open(token_path(port), 'r', encoding='utf-8') as f:
+            token = f.read().strip()
+    data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{endpoint}", data=data,
+                                 headers={"Content-Type": "application/json", TOKEN_HEADER: token})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep fonts and caches warm in a local render server.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port on 127.0.0.1 (default: {DEFAULT_PORT}).")
+    args = parser.parse_args()
+    serve(args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Lazy readers for the ruby HTML input of every stage, one line at a time, so the first image or cue
+is produced before a large file has been read and memory does not grow with the file.
+
+The format follows the extension:
+    .txt    the reading fields pasted one per line, used as they are (convert_quotes.py is optional)
+    .jsonl  one JSON string per line, as written by convert_quotes.py --jsonl
+    .json   the JSON array of convert_quotes.py; it is loaded whole, as before
+Every line is one subtitle, blank ones included, so a blank line keeps its SRT cue in every format.
+Only the blank lines at the end of a file (such as the "" convert_quotes.py leaves for the final
+newline) are dropped.
+"""
+import json
+import os
+
+
+def without_trailing_blanks(lines):
+    """Yield lines, holding blank ones back until a non-blank line shows they are not the end."""
+    blanks = []
+    for line in lines:
+        if not line.strip():
+            blanks.append(line)
+            continue
+        yield from blanks
+        blanks.clear()
+        yield line
+
+
+def read_ruby_lines(input_txt):
+    """Yield the lines of a ruby HTML .txt file one at a time."""
+    with open(input_txt, 'r', encoding='utf-8-sig') as file:
+        yield from without_trailing_blanks(line.strip() for line in file)
+
+
+def _jsonl_strings(input_jsonl):
+    with open(input_jsonl, 'r', encoding='utf-8-sig') as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                yield ""  # A blank line, like in the .txt
+                continue
+            html = json.loads(line)
+            if not isinstance(html, str):
+                raise ValueError(f"{input_jsonl}, line {number}: expected a JSON string")
+            yield html
+
+
+def read_jsonl_lines(input_jsonl):
+    """Yield the ruby HTML strings of a JSONL file one at a time."""
+    return without_trailing_blanks(_jsonl_strings(input_jsonl))
+
+
+def read_json_lines(input_json):
+    """Yield the ruby HTML strings of a JSON array file."""
+    with open(input_json, 'r', encoding='utf-8') as file:
+        yield from without_trailing_blanks(json.load(file))
+
+
+def read_ruby_input(path):
+    """Yield the ruby HTML lines of a .txt, .jsonl or .json file, chosen by its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".jsonl":
+        return read_jsonl_lines(path)
+    if extension == ".json":
+        return read_json_lines(path)
+    return read_ruby_lines(path)
+
+
+def write_jsonl(lines, output_path):
+    """Write ruby HTML lines as JSONL, one line at a time, and return how many were written."""
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as file:
+        for html in lines:
+            file.write(json.dumps(html, ensure_ascii=False) + "\n")
+            count += 1
+    return count
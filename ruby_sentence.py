@@ -0,0 +1,99 @@
+"""
+Compact in-memory form of a parsed ruby line, shared by the PNG, romaji and XML stages.
+
+A sentence used to be {"kanji_ruby_pairs": [{"kanji": ..., "ruby": ...}, ...]}: two dicts per
+segment, plus the HTML kept around for the romaji stage to tokenize again. Here a segment is a
+two-slot object, a sentence holds tuples, and every string is interned, so the words a song
+repeats are stored once. The romaji terms come out of the same tokenizer pass as the segments.
+Compare both forms with py -m benchmarks.bench_memory.
+"""
+import sys
+
+from profiling import PROFILER, traced
+from ruby_tokenizer import tokenize_ruby
+
+
+class RubySegment:
+    """One base text and its reading ("" outside ruby)."""
+    __slots__ = ("kanji", "ruby")
+
+    def __init__(self, kanji, ruby=""):
+        self.kanji = sys.intern(kanji)
+        self.ruby = sys.intern(ruby)
+
+    def __eq__(self, other):
+        return isinstance(other, RubySegment) and (self.kanji, self.ruby) == (other.kanji, other.ruby)
+
+    def __hash__(self):
+        return hash((self.kanji, self.ruby))
+
+    def __repr__(self):
+        return f"RubySegment({self.kanji!r}, {self.ruby!r})"
+
+
+class Sentence:
+    """
+    The segments of one line as the images lay them out (text outside ruby merged up to the next
+    ruby), and its romaji terms: the readings of every <span class="term">, or its text outside ruby.
+    """
+    __slots__ = ("kanji_ruby_pairs", "terms")
+
+    def __init__(self, kanji_ruby_pairs, terms=()):
+        self.kanji_ruby_pairs = tuple(kanji_ruby_pairs)
+        self.terms = tuple(terms)
+
+    def __repr__(self):
+        return f"Sentence({list(self.kanji_ruby_pairs)!r}, {list(self.terms)!r})"
+
+
+def as_segments(kanji_ruby_pairs):
+    """The pairs as RubySegments, converting the {"kanji": ..., "ruby": ...} dicts of the old form."""
+    return tuple(pair if isinstance(pair, RubySegment) else RubySegment(**pair) for pair in kanji_ruby_pairs)
+
+
+def as_sentence(sentence):
+    """The sentence as a Sentence, converting the old {"kanji_ruby_pairs": [...]} dict form."""
+    if isinstance(sentence, Sentence):
+        return sentence
+    return Sentence(as_segments(sentence["kanji_ruby_pairs"]))
+
+
+@traced("parse")
+def parse_sentence(html):
+    """Parse one line of ruby HTML into a Sentence with kanji and ruby components."""
+    kanji_ruby_pairs = []
+    plain_text = ""
+    terms = []
+    term = ""
+    for base, reading, term_start in tokenize_ruby(html):
+        if term_start and term:
+            terms.append(sys.intern(term))
+            term = ""
+        term += (reading or base).strip()
+
+        if not reading:
+            # Plain text outside ruby tags, merged up to the next ruby
+            plain_text += base
+            continue
+        if plain_text.strip():
+            kanji_ruby_pairs.append(RubySegment(plain_text.strip()))
+        plain_text = ""
+        kanji_ruby_pairs.append(RubySegment(base.strip(), reading.strip()))
+    if plain_text.strip():
+        kanji_ruby_pairs.append(RubySegment(plain_text.strip()))
+    if term:
+        terms.append(sys.intern(term))
+
+    return Sentence(kanji_ruby_pairs, terms)
+
+
+def parse_json(input_data):
+    """Parse the JSON input into a list of sentences with kanji and ruby components."""
+    return [parse_sentence(html) for html in input_data]
+
+
+def iter_sentences(lines):
+    """Parse ruby HTML lines into sentences lazily, as the caller consumes them."""
+    for number, html in enumerate(lines, 1):
+        PROFILER.set_line(number)
+        yield parse_sentence(html)
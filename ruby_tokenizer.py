@@ -0,0 +1,64 @@
+"""
+Single-pass tokenizer for the ruby HTML that Yomitan/Anki put in the reading field, shared by the
+PNG and romaji stages instead of regex splitting or a BeautifulSoup tree per line.
+"""
+import re
+from html import unescape
+
+# One tag: closing slash, name, and the rest (attributes) up to ">"
+_TAG = re.compile(r"<(/?)([A-Za-z]*)([^>]*)>")
+
+
+def tokenize_ruby(html):
+    """
+    Split one line of ruby HTML into (base, reading, term_start) segments, in order.
+
+    Text outside <ruby> becomes a segment with an empty reading and is kept unstripped, one
+    segment per run of text between tags. term_start is True for the first segment of every
+    <span class="term"> (nested spans included) and for the first segment of the line. Empty
+    <ruby></ruby> elements produce nothing, <rp> fallbacks are dropped and entities are decoded.
+    """
+    segments = []
+    term_start = True
+    in_ruby = False
+    in_rt = False
+    in_rp = False
+    base = ""
+    reading = ""
+
+    # split() alternates text with the (closing, name, attributes) groups of each tag
+    parts = _TAG.split(html)
+    for i in range(0, len(parts), 4):
+        text = parts[i]
+        if text:
+            if "&" in text:
+                text = unescape(text)
+            if not in_ruby:
+                segments.append((text, "", term_start))
+                term_start = False
+            elif in_rt:
+                reading += text
+            elif not in_rp:
+                base += text
+        if i + 1 == len(parts):
+            break
+
+        closing, name, attributes = parts[i + 1], parts[i + 2].lower(), parts[i + 3]
+        if name == "ruby":
+            if in_ruby and (base.strip() or reading.strip()):
+                segments.append((base, reading, term_start))
+                term_start = False
+            in_ruby = not closing
+            in_rt = in_rp = False
+            base = reading = ""
+        elif name == "rt":
+            in_rt = not closing
+        elif name == "rp":
+            in_rp = not closing
+        elif name == "span" and not closing and "term" in attributes:
+            term_start = True
+
+    # Unclosed <ruby> at the end of the line
+    if in_ruby and (base.strip() or reading.strip()):
+        segments.append((base, reading, term_start))
+    return segments
@@ -0,0 +1,102 @@
+"""Incremental rebuilds of generate_png_furigana.ImageBuild, run through generate_all.run_pipeline."""
+import os
+
+import pytest
+from PIL import Image, ImageFont
+
+from generate_all import run_pipeline
+from generate_png_furigana import FontRegistry, ImageSubtitleCreator, RenderError
+
+LINES = ["<ruby>涙<rt>なみだ</rt></ruby>の", "<ruby>温<rt>ぬく</rt></ruby>もり", "<ruby>声<rt>こえ</rt></ruby>"]
+SRT = "".join(f"{i}\n00:00:0{i},000 --> 00:00:0{i},500\nx\n\n" for i in range(1, len(LINES) + 1))
+
+
+class BuiltinFonts(FontRegistry):
+    """Pillow's bundled font, so the tests do not need a TTF on disk."""
+    def get(self, font_path, size):
+        return ImageFont.load_default(size)
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def run(tmp_path, lines, jobs=1, creator=None):
+    if creator is None:
+        creator = ImageSubtitleCreator("missing", 48, 24, 100, "black", "white", 2, str(tmp_path / "images"))
+        creator.fonts = BuiltinFonts()
+    os.makedirs(creator.output_dir, exist_ok=True)
+    run_pipeline(write(tmp_path / "lines.txt", "\n".join(lines)), write(tmp_path / "timings.srt", SRT),
+                 str(tmp_path / "timeline.xml"), str(tmp_path / "romaji.srt"), creator, jobs=jobs)
+    return creator.output_dir
+
+
+def pixels(output_dir, index):
+    with Image.open(os.path.join(output_dir, f"sentence_{index}.png")) as image:
+        return image.tobytes()
+
+
+def test_failed_run_does_not_leave_stale_images_for_reuse(tmp_path):
+    output_dir = run(tmp_path, LINES)
+    original = pixels(output_dir, 1)
+
+    # Line 1 changes and the extra line fails the run after sentence_1.png was overwritten
+    with pytest.raises(ValueError):
+        run(tmp_path, ["<ruby>雨<rt>あめ</rt></ruby>"] + LINES[1:] + ["<ruby>空<rt>そら</rt></ruby>"])
+    assert pixels(output_dir, 1) != original
+
+    run(tmp_path, LINES)
+    assert pixels(output_dir, 1) == original
+
+
+def test_unchanged_run_reuses_images(tmp_path, capsys):
+    run(tmp_path, LINES)
+    capsys.readouterr()
+    run(tmp_path, LINES)
+    assert "Rendered 0 images, reused 3 unchanged" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_layout_error_fails_only_its_line(tmp_path, jobs):
+    creator = ImageSubtitleCreator("missing", 48, 24, 100, "black", "white", 2, str(tmp_path / "images"))
+    creator.fonts = BuiltinFonts()
+    measure = creator._measure_sentence
+
+    def failing_measure(kanji_ruby_pairs):
+        if kanji_ruby_pairs[0].kanji == "壊":
+            raise RuntimeError("boom")
+        return measure(kanji_ruby_pairs)
+
+    creator._measure_sentence = failing_measure
+    lines = [f"<ruby>{kanji}<rt>よみ</rt></ruby>{jobs}" for kanji in ("星", "壊", "月")]
+    with pytest.raises(RenderError) as error:
+        run(tmp_path, lines, jobs=jobs, creator=creator)
+    failed = [index for index, _ in error.value.failures]
+    assert 1 in failed
+    if jobs == 1:
+        assert failed == [1]  # With --jobs the workers have no built-in font, so the other lines fail too
+
+
+def test_missing_font_with_jobs_fails_per_line(tmp_path):
+    creator = ImageSubtitleCreator("missing", 48, 24, 100, "black", "white", 2, str(tmp_path / "images"))
+    with pytest.raises(RenderError) as error:
+        run(tmp_path, ["<ruby>海<rt>うみ</rt></ruby>", "<ruby>山<rt>やま</rt></ruby>", "<ruby>川<rt>かわ</rt></ruby>"],
+            jobs=2, creator=creator)
+    assert [index for index, _ in error.value.failures] == [0, 1, 2]
+
+
+def test_old_dict_sentences_render_like_parsed_ones(tmp_path):
+    from generate_png_furigana import parse_json
+
+    creator = ImageSubtitleCreator("missing", 48, 24, 100, "black", "white", 2, str(tmp_path))
+    creator.fonts = BuiltinFonts()
+    sentence = parse_json(LINES[:1])[0]
+    pairs = [{"kanji": segment.kanji, "ruby": segment.ruby} for segment in sentence.kanji_ruby_pairs]
+
+    creator.generate_images([sentence])
+    parsed = pixels(str(tmp_path), 1)
+    creator.generate_images([{"kanji_ruby_pairs": pairs}], force=True)
+    assert pixels(str(tmp_path), 1) == parsed
+    creator.render_sentence_image(pairs, 1)
+    assert pixels(str(tmp_path), 2) == parsed
@@ -0,0 +1,66 @@
+"""render_server.RenderServer on a free port, called the way request() and a web page would."""
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+from render_server import TOKEN_HEADER, RenderServer, request
+from test_image_build import BuiltinFonts
+
+TOKEN = "test-token"
+LINE = "<span class='term'><ruby>涙<rt>なみだ</rt></ruby></span>"
+
+
+@pytest.fixture
+def server():
+    server = RenderServer(0, TOKEN)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def post(server, endpoint, body, headers):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=10)
+    try:
+        connection.request("POST", endpoint, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_render_and_romaji(server, tmp_path):
+    style = {"font_name": "missing", "font_size": 48, "ruby_size": 24, "vertical_margin": 100, "text_color": "black",
+             "stroke_color": "white", "stroke_width": 2, "output_dir": str(tmp_path)}
+    server.service.creator(style).fonts = BuiltinFonts()
+
+    response = request("/render", {"style": style, "lines": [LINE], "first_index": 4},
+                       port=server.server_port, token=TOKEN)
+    assert response["images"] == [{"index": 4, "path": os.path.join(str(tmp_path), "sentence_5.png")}]
+    assert os.path.exists(tmp_path / "sentence_5.png")
+
+    response = request("/romaji", {"lines": [LINE]}, port=server.server_port, token=TOKEN)
+    assert response["romaji"] == ["namida"]
+
+
+def test_bad_request_is_400(server):
+    status, response = post(server, "/render", b'{"lines": []}',
+                            {"Content-Type": "application/json", TOKEN_HEADER: TOKEN})
+    assert status == 400
+    assert "style" in response["error"]
+
+
+@pytest.mark.parametrize("headers", [
+    {"Content-Type": "text/plain", TOKEN_HEADER: TOKEN},  # What a cross-origin page can send without a preflight
+    {"Content-Type": "application/json"},
+    {"Content-Type": "application/json", TOKEN_HEADER: "wrong"},
+    {"Content-Type": "application/json", TOKEN_HEADER: TOKEN, "Host": "evil.example:8765"},  # DNS rebinding
+])
+def test_refuses_requests_a_web_page_could_send(server, headers):
+    status, _ = post(server, "/romaji", json.dumps({"lines": [LINE]}).encode("utf-8"), headers)
+    assert status in (403, 415)
@@ -0,0 +1,27 @@
+"""generate_srt_romaji: kana to romaji, and whole lines of ruby HTML."""
+import pytest
+
+from generate_srt_romaji import convert_html_to_romaji_srt, transliterate_to_romaji
+
+
+@pytest.mark.parametrize("kana, romaji", [
+    ("なみだ", "namida"),
+    ("カタカナ", "katakana"),
+    ("ヴ", "vu"),
+    ("しょうどう", "shoudou"),
+    ("がっこう", "gakkou"),  # っ doubles the next consonant
+    ("ちょっと", "chotto"),
+    ("コーヒー", "koohii"),  # ー repeats the previous vowel
+    ("ラーメン", "raamen"),
+    ("しんぶん", "shinbun"),
+    ("ー", "ー"),  # Nothing to lengthen
+    ("abc", "abc"),  # Not kana, kept as it is
+])
+def test_transliterate_to_romaji(kana, romaji):
+    assert transliterate_to_romaji(kana) == romaji
+
+
+def test_line_keeps_kana_outside_ruby_in_its_term():
+    html = ('<span class="term"><ruby>生<rt>う</rt></ruby>み<ruby>出<rt>だ</rt></ruby>して</span>'
+            '<span class="term">ゆく</span>')
+    assert convert_html_to_romaji_srt(html) == "umidashite yuku"
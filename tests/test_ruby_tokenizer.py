@@ -0,0 +1,25 @@
+"""ruby_tokenizer.tokenize_ruby on the HTML shapes the reading field comes in."""
+import pytest
+
+from ruby_tokenizer import tokenize_ruby
+
+CASES = [
+    ("plain", "ただの文", [("ただの文", "", True)]),
+    ("ruby", "<ruby>涙<rt>なみだ</rt></ruby>の", [("涙", "なみだ", True), ("の", "", False)]),
+    ("nested spans",
+     '<span class="term"><span class="term"><ruby>一<rt>いち</rt></ruby></span>つ</span>',
+     [("一", "いち", True), ("つ", "", False)]),
+    ("term per span",
+     '<span class="term">a</span><span class="term"><ruby>日<rt>に</rt></ruby><ruby>本<rt>ほん</rt></ruby></span>',
+     [("a", "", True), ("日", "に", True), ("本", "ほん", False)]),
+    ("empty ruby", "<ruby></ruby>あ", [("あ", "", True)]),
+    ("rp fallback", "<ruby>漢<rp>(</rp><rt>かん</rt><rp>)</rp></ruby>", [("漢", "かん", True)]),
+    ("entities", "A&amp;B <ruby>&lt;字&gt;<rt>じ&#12354;</rt></ruby>", [("A&B ", "", True), ("<字>", "じあ", False)]),
+    ("unclosed ruby", "<ruby>字<rt>じ</rt>", [("字", "じ", True)]),
+    ("upper-case tags", "<RUBY>字<RT>じ</RT></RUBY>", [("字", "じ", True)]),
+]
+
+
+@pytest.mark.parametrize("html, expected", [case[1:] for case in CASES], ids=[case[0] for case in CASES])
+def test_tokenize_ruby(html, expected):
+    assert tokenize_ruby(html) == expected
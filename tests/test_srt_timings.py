@@ -0,0 +1,67 @@
+"""SRT timing parsing in generate_xml, and its use by the romaji stage."""
+import pytest
+
+from generate_srt_romaji import process_json_to_srt, read_srt_timings
+from generate_xml import iter_srt_timings, timecode_to_frames, timecode_to_ms
+
+TIMINGS = "1\n00:00:01,000 --> 00:00:02,000\nlook --> here\n\n2\n00:00:03,000 --> 00:00:04,500\nx\n\n"
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("timecode, ms", [
+    ("00:00:00,000", 0),
+    ("00:00:01,500", 1500),
+    ("01:02:03,004", 3723004),
+    ("00:00:01.250", 1250),  # A dot instead of the comma
+    ("00:00:01,5", 1500),  # Fewer digits are a fraction
+    ("00:00:01,05", 1050),
+    (" 0:1:2,003 ", 62003),
+    ("100:00:00,000", 360000000),
+])
+def test_timecode_to_ms(timecode, ms):
+    assert timecode_to_ms(timecode) == ms
+
+
+@pytest.mark.parametrize("timecode", ["", "00:00:01", "00:00:01,0000", "aa:00:01,000", "00:00:01,000 x"])
+def test_timecode_to_ms_rejects(timecode):
+    with pytest.raises(ValueError):
+        timecode_to_ms(timecode)
+
+
+def test_timecode_to_frames_is_exact():
+    # 1.16 s * 25 and 4.1 s * 30 come out as 28.999... and 122.999... in floats
+    assert timecode_to_frames("00:00:01,160", 25) == 29
+    assert timecode_to_frames("00:00:04,100", 30) == 123
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1\n00:00:01,000 --> 00:00:02,000\na\n\n", [("00:00:01,000", "00:00:02,000")]),
+    ("\ufeff1\n00:00:01,000 --> 00:00:02,000\na\n", [("00:00:01,000", "00:00:02,000")]),  # UTF-8 BOM
+    ("3\n00:00:01,000 --> 00:00:02,000\na\n\n7\n00:00:03,000 --> 00:00:04,000\nb\n",  # Gaps in numbering
+     [("00:00:01,000", "00:00:02,000"), ("00:00:03,000", "00:00:04,000")]),
+    ("00:00:01,000 --> 00:00:02,000\na\n\n00:00:03,000 --> 00:00:04,000\nb\n",  # No numbers at all
+     [("00:00:01,000", "00:00:02,000"), ("00:00:03,000", "00:00:04,000")]),
+    ("1\n00:00:01,000 --> 00:00:02,000\nfirst\nsecond\n\nthird\n\n2\n00:00:03,000 --> 00:00:04,000\nb\n",  # Multi-line
+     [("00:00:01,000", "00:00:02,000"), ("00:00:03,000", "00:00:04,000")]),
+    ("1\n00:00:01,000 --> 00:00:02,000\nlook --> here\n\n", [("00:00:01,000", "00:00:02,000")]),  # --> in a lyric
+    ("1\n00:00:01,000-->00:00:02,000 X1:10 X2:20\na\n", [("00:00:01,000", "00:00:02,000")]),  # Position settings
+    ("1\r\n00:00:01,000 --> 00:00:02,000\r\na\r\n", [("00:00:01,000", "00:00:02,000")]),  # CRLF
+])
+def test_iter_srt_timings(tmp_path, text, expected):
+    path = tmp_path / "cues.srt"
+    path.write_bytes(text.encode("utf-8"))
+    assert list(iter_srt_timings(str(path))) == expected
+
+
+def test_romaji_stage_ignores_arrows_in_lyrics(tmp_path):
+    timings = write(tmp_path / "timings.srt", TIMINGS)
+    assert read_srt_timings(timings) == ["00:00:01,000 --> 00:00:02,000", "00:00:03,000 --> 00:00:04,500"]
+
+    lines = write(tmp_path / "lines.txt", "<ruby>涙<rt>なみだ</rt></ruby>\n<ruby>声<rt>こえ</rt></ruby>")
+    process_json_to_srt(lines, str(tmp_path / "romaji.srt"), timings)
+    assert (tmp_path / "romaji.srt").read_text(encoding="utf-8") == \
+        "1\n00:00:01,000 --> 00:00:02,000\nnamida\n\n2\n00:00:03,000 --> 00:00:04,500\nkoe\n\n"
@@ -0,0 +1,39 @@
+"""The XML stage: generate_xml reading a manifest lazily and writing only shared images' durations late."""
+import json
+import re
+
+import pytest
+
+from generate_png_furigana import write_manifest
+from generate_xml import MANIFEST_NAME, create_xmeml, iter_manifest, shared_manifest_files
+
+ENTRIES = [
+    {"file": "sentence_1.png", "x": 0, "y": 0, "width": 1920, "height": 1080},
+    {"file": "sentence_2.png", "x": 0, "y": 0, "width": 1920, "height": 1080},
+    {"file": "sentence_1.png", "x": 0, "y": 0, "width": 1920, "height": 1080},  # Repeats line 1
+]
+SRT = ("1\n00:00:01,000 --> 00:00:02,000\na\n\n2\n00:00:02,000 --> 00:00:03,000\nb\n\n"
+       "3\n00:00:03,000 --> 00:00:07,000\na\n\n")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_iter_manifest_matches_json_load(tmp_path, chunk_size):
+    path = write_manifest(str(tmp_path), ENTRIES, 1920, 1080, {"path": "images/font.ttf", "size": 12})
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    items = list(iter_manifest(path, chunk_size))
+    assert dict(item for kind, item in items if kind == "header") == {k: v for k, v in manifest.items() if k != "images"}
+    assert [item for kind, item in items if kind == "image"] == manifest["images"]
+
+
+def test_only_shared_images_wait_for_their_duration(tmp_path):
+    write_manifest(str(tmp_path), ENTRIES, 1920, 1080)
+    assert shared_manifest_files(str(tmp_path / MANIFEST_NAME)) == {"sentence_1.png"}
+    (tmp_path / "timings.srt").write_text(SRT, encoding="utf-8")
+    create_xmeml(str(tmp_path), str(tmp_path / "timings.srt"), str(tmp_path / "timeline.xml"))
+
+    xml = (tmp_path / "timeline.xml").read_text(encoding="utf-8")
+    # The sequence and line 1's file (as long as its longest clip, the repeat) are patched into padded
+    # slots at the end; line 2's file is written with its own clip's duration straight away
+    durations = [(value, bool(padding)) for value, padding in re.findall(r"<duration>(\d+)</duration>( *)", xml)]
+    assert durations == [("168", True), ("96", True), ("96", True), ("24", False), ("24", False)]